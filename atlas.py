@@ -0,0 +1,86 @@
+"""Pack card art into atlas pages for towerclash.CardArt.
+
+    python atlas.py [--src assets/cards] [--out assets/atlas] [--page-size 1000]
+
+Each <src>/<slug>.png (slug as in towerclash.art_slug, e.g. basic_warrior.png)
+is scaled to towerclash.CARD_ART_SIZE and placed on a grid of square pages,
+in catalog order so cards defined together tend to share a page. The output
+directory gets page_<n>.png files and an index.json mapping each slug to
+[page, x, y]. Run it again whenever art is added or changed.
+"""
+import argparse
+import glob
+import json
+import os
+
+import pygame
+
+import towerclash as tc
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+SRC_DIR = os.path.join(ASSETS_DIR, 'cards')
+
+
+def collect_art(src_dir):
+    """Map slug -> source path, catalog cards first and in catalog order."""
+    paths = {os.path.splitext(os.path.basename(p))[0]: p for p in glob.glob(os.path.join(src_dir, '*.png'))}
+    order = {tc.art_slug(name): i for i, name in enumerate(tc.card_names)}
+    return sorted(paths.items(), key=lambda item: (order.get(item[0], len(order)), item[0]))
+
+
+def build_atlas(src_dir, out_dir, page_size=1000):
+    w, h = tc.CARD_ART_SIZE
+    cols, rows = page_size // w, page_size // h
+    if not cols or not rows:
+        raise ValueError(f"page size {page_size} cannot hold a {w}x{h} sprite")
+    per_page = cols * rows
+    art = collect_art(src_dir)
+
+    os.makedirs(out_dir, exist_ok=True)
+    for old in glob.glob(os.path.join(out_dir, 'page_*.png')):
+        os.remove(old)
+
+    pages, sprites = [], {}
+    for start in range(0, len(art), per_page):
+        page_no = len(pages)
+        page = pygame.Surface((cols * w, rows * h), pygame.SRCALPHA)
+        for i, (slug, path) in enumerate(art[start:start + per_page]):
+            # Blit into a 32-bit surface first: smoothscale needs one and
+            # convert_alpha() would need a display
+            src = pygame.image.load(path)
+            rgba = pygame.Surface(src.get_size(), pygame.SRCALPHA)
+            rgba.blit(src, (0, 0))
+            x, y = (i % cols) * w, (i // cols) * h
+            page.blit(pygame.transform.smoothscale(rgba, (w, h)), (x, y))
+            sprites[slug] = [page_no, x, y]
+        name = f'page_{page_no}.png'
+        pygame.image.save(page, os.path.join(out_dir, name))
+        pages.append(name)
+
+    index_path = os.path.join(out_dir, 'index.json')
+    with open(index_path + '.tmp', 'w') as f:
+        json.dump({'size': [w, h], 'pages': pages, 'sprites': sprites}, f)
+    os.replace(index_path + '.tmp', index_path)
+
+    unused = sorted(set(sprites) - {tc.art_slug(name) for name in tc.card_names})
+    missing = sorted(name for name in tc.card_names if tc.art_slug(name) not in sprites)
+    return len(sprites), len(pages), unused, missing
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack card art into atlas pages.")
+    parser.add_argument('--src', default=SRC_DIR, help="directory of <slug>.png card art")
+    parser.add_argument('--out', default=tc.ATLAS_DIR)
+    parser.add_argument('--page-size', type=int, default=1000, help="page width and height in pixels")
+    args = parser.parse_args(argv)
+
+    count, page_count, unused, missing = build_atlas(args.src, args.out, args.page_size)
+    print(f"{count} sprites on {page_count} pages -> {args.out}")
+    if unused:
+        print(f"not in the card catalog: {', '.join(unused)}")
+    if missing:
+        print(f"no art (placeholder used): {', '.join(missing)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Lock-step NumPy simulation of many Tower Clash battles at once.
+
+Follows the rules of towerclash.BattleEngine exactly (same float operations in
+the same order), but holds the card state of N battles in (N, slots) arrays and
+advances every battle's status/player/enemy phase together.
+"""
+from collections import namedtuple
+
+import numpy as np  # numpy is only needed for batch simulation → pip install numpy
+
+from towerclash import (
+    ABILITY_BURN_AOE, ABILITY_COUNTER, ABILITY_NONE, ABILITY_REVIVE, ABILITY_STEAL,
+    card_ability, card_atk, card_hp, card_ids, clean_deck,
+)
+
+BatchResult = namedtuple('BatchResult', ['victory', 'turns', 'steps', 'player_hp', 'enemy_hp', 'valid'])
+
+# Views of the catalog's id-indexed stat arrays
+base_hp = np.frombuffer(card_hp, dtype=np.float64)
+base_atk = np.frombuffer(card_atk, dtype=np.float64)
+base_ability = np.frombuffer(card_ability, dtype=np.int8)
+
+
+class _Side:
+    """Card state for one side of every battle in the batch."""
+    def __init__(self, decks, scales):
+        n = len(decks)
+        width = max([len(d) for d in decks] + [1])
+        ids = np.full((n, width), -1, dtype=np.int32)
+        for row, deck in enumerate(decks):
+            ids[row, :len(deck)] = [card_ids[name] for name in deck]
+        self.present = ids >= 0
+        ids = np.where(self.present, ids, 0)
+
+        self.max_hp = base_hp[ids] * scales[:, None]
+        self.hp = np.where(self.present, self.max_hp, 0.0)
+        self.atk = base_atk[ids] * scales[:, None]
+        self.ability = np.where(self.present, base_ability[ids], ABILITY_NONE).astype(np.int8)
+        self.alive = self.present.copy()
+        self.burn_dmg = np.zeros((n, width))
+        self.entry_done = np.zeros((n, width), dtype=bool)
+        self.dmg_mult = np.ones((n, width))
+        self.revives_used = np.zeros((n, width), dtype=np.int8)
+        self.has_stolen = np.zeros((n, width), dtype=bool)
+
+    def take_damage(self, rows, cols, dmg):
+        hp = self.hp[rows, cols] - dmg
+        revive = (hp <= 0) & (self.ability[rows, cols] == ABILITY_REVIVE) & (self.revives_used[rows, cols] < 1)
+        self.revives_used[rows[revive], cols[revive]] += 1
+        hp = np.where(revive, self.max_hp[rows, cols] * 0.5, hp)
+        hp = np.maximum(hp, 0.0)
+        self.hp[rows, cols] = hp
+        self.alive[rows, cols] = hp > 0
+
+    def enter(self, active):
+        """Mark burn_aoe entries that trigger now; returns the battles where one did."""
+        entering = (self.ability == ABILITY_BURN_AOE) & ~self.entry_done & self.alive & active[:, None]
+        self.entry_done |= entering
+        return entering.any(axis=1)
+
+    def ignite(self, battles):
+        hit = self.alive & battles[:, None]
+        self.burn_dmg[hit] = 0.15 * self.max_hp[hit]
+
+    def front(self, rows):
+        return self.alive[rows].argmax(axis=1)
+
+    def total_hp(self):
+        # Summed slot by slot so the result matches sum() over the scalar cards
+        total = np.zeros(len(self.hp))
+        for col in range(self.hp.shape[1]):
+            total += np.where(self.alive[:, col], self.hp[:, col], 0.0)
+        return total
+
+
+def _attack(att, tgt, active, turn):
+    rows = np.nonzero(active & att.alive.any(axis=1) & tgt.alive.any(axis=1))[0]
+    if not len(rows):
+        return
+    a = att.front(rows)
+    t = tgt.front(rows)
+    mult = att.dmg_mult[rows, a]
+    if turn % 2 == 0:
+        mult = np.where(att.ability[rows, a] == ABILITY_COUNTER, mult * 1.75, mult)
+    dmg = att.atk[rows, a] * mult
+    steal = (att.ability[rows, a] == ABILITY_STEAL) & ~att.has_stolen[rows, a]
+    att.has_stolen[rows[steal], a[steal]] = True
+    att.atk[rows[steal], a[steal]] *= 1.5
+    tgt.take_damage(rows, t, dmg)
+
+
+def simulate_batch(matchups):
+    """Resolve a list of (player deck, enemy deck, scale) matchups together.
+
+    Returns a BatchResult of arrays indexed like ``matchups``. Matchups with an
+    empty deck (where simulate_battle returns None) have ``valid`` False.
+    """
+    matchups = list(matchups)
+    p_decks = [clean_deck(p) for p, _, _ in matchups]
+    e_decks = [clean_deck(e) for _, e, _ in matchups]
+    scales = np.array([s for _, _, s in matchups], dtype=np.float64)
+    n = len(matchups)
+
+    valid = np.array([bool(p) and bool(e) for p, e in zip(p_decks, e_decks)], dtype=bool)
+    p = _Side(p_decks, scales)
+    e = _Side(e_decks, scales)
+
+    victory = np.zeros(n, dtype=bool)
+    turns = np.zeros(n, dtype=np.int32)
+    steps = np.zeros(n, dtype=np.int32)
+    done = ~valid
+    turn = 0
+    step = 0
+
+    while not done.all():
+        active = ~done
+        phase = step % 3
+        if phase == 0:
+            for side in (p, e):
+                rows, cols = np.nonzero(side.alive & (side.burn_dmg > 0) & active[:, None])
+                side.take_damage(rows, cols, side.burn_dmg[rows, cols])
+            p_entered = p.enter(active)
+            e_entered = e.enter(active)
+            e.ignite(p_entered)
+            p.ignite(e_entered)
+        elif phase == 1:
+            _attack(p, e, active, turn)
+        else:
+            _attack(e, p, active, turn)
+            turn += 1
+        step += 1
+
+        won = active & ~e.alive.any(axis=1)
+        lost = active & ~won & ~p.alive.any(axis=1)
+        finished = won | lost
+        victory |= won
+        turns[finished] = turn
+        steps[finished] = step
+        done |= finished
+
+    return BatchResult(victory, turns, steps, p.total_hp(), e.total_hp(), valid)
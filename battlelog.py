@@ -0,0 +1,180 @@
+"""Compact binary log of battle engine events.
+
+Every BattleEvent becomes one fixed-width little-endian record (see
+record_dtype), tagged with the id of the battle it belongs to. Files start with
+a HEADER_SIZE-byte header. BattleLogWriter packs and writes on a background
+thread; read_events() memory-maps a file as a NumPy structured array.
+
+    python battlelog.py record events.tcev [--unlocked]   # every deck x tower floor
+    python battlelog.py stats events.tcev
+
+The game itself appends every battle it resolves to the file named by the
+TOWERCLASH_EVENT_LOG environment variable (see towerclash.log_battle_events).
+"""
+import argparse
+import mmap
+import os
+import queue
+import struct
+import threading
+
+import numpy as np
+
+import towerclash as tc
+import winmatrix
+
+MAGIC = b'TCEV'
+VERSION = 1
+HEADER_SIZE = 16
+header_struct = struct.Struct('<4sHH8x')  # magic, version, record size
+
+event_kinds = ['burn', 'entry', 'steal', 'attack', 'damage', 'revive', 'death']
+kind_codes = {kind: code for code, kind in enumerate(event_kinds)}
+phase_codes = {phase: code for code, phase in enumerate(tc.PHASES)}
+side_codes = {'player': 0, 'enemy': 1, None: 255}
+NO_SLOT = 0xFFFF
+
+record_struct = struct.Struct('<IIBBBBHHd')
+record_dtype = np.dtype([
+    ('battle', '<u4'),
+    ('turn', '<u4'),
+    ('phase', 'u1'),
+    ('kind', 'u1'),
+    ('side', 'u1'),
+    ('target_side', 'u1'),
+    ('slot', '<u2'),
+    ('target_slot', '<u2'),
+    ('amount', '<f8'),
+])
+assert record_dtype.itemsize == record_struct.size
+
+
+def pack_events(battle_id, events):
+    buf = bytearray(record_struct.size * len(events))
+    pack_into = record_struct.pack_into
+    for i, ev in enumerate(events):
+        pack_into(buf, i * record_struct.size,
+                  battle_id, ev.turn, phase_codes[ev.phase], kind_codes[ev.kind],
+                  side_codes[ev.side], side_codes[ev.target_side],
+                  NO_SLOT if ev.slot is None else ev.slot,
+                  NO_SLOT if ev.target_slot is None else ev.target_slot,
+                  ev.amount)
+    return bytes(buf)
+
+
+class BattleLogWriter:
+    """Streams packed battle events to a file from a background thread.
+
+    write_battle() only packs and queues; the queue is bounded so a slow disk
+    applies backpressure instead of growing memory. Use as a context manager or
+    call close() to flush.
+
+    With append=True an existing log is continued rather than replaced: a
+    trailing partial record is dropped and next_battle_id starts after the
+    highest battle id already in the file.
+    """
+    def __init__(self, path, queue_size=64, buffer_size=1 << 20, append=False):
+        self.path = path
+        self.next_battle_id = 0
+        if append and os.path.exists(path) and os.path.getsize(path) > 0:
+            events = read_events(path)
+            if len(events):
+                self.next_battle_id = int(events['battle'].max()) + 1
+            end = HEADER_SIZE + len(events) * record_struct.size
+            del events
+            self.file = open(path, 'r+b', buffering=buffer_size)
+            self.file.truncate(end)
+            self.file.seek(end)
+        else:
+            self.file = open(path, 'wb', buffering=buffer_size)
+            self.file.write(header_struct.pack(MAGIC, VERSION, record_struct.size))
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self._drain, name='battlelog-writer', daemon=True)
+        self.thread.start()
+
+    def _drain(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                break
+            if self.error is None:
+                try:
+                    self.file.write(chunk)
+                except OSError as e:
+                    self.error = e
+
+    def write_battle(self, battle_id, events):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(pack_events(battle_id, events))
+        self.next_battle_id = max(self.next_battle_id, battle_id + 1)
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.file.close()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_events(path):
+    """Memory-map a log file as a structured array of record_dtype.
+
+    A trailing partial record (from an interrupted writer) is ignored.
+    """
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(mm) < HEADER_SIZE:
+        raise ValueError(f"{path}: not a battle event log")
+    magic, version, record_size = header_struct.unpack_from(mm)
+    if magic != MAGIC or version != VERSION or record_size != record_dtype.itemsize:
+        raise ValueError(f"{path}: unsupported battle event log (version {version})")
+    count = (len(mm) - HEADER_SIZE) // record_size
+    return np.frombuffer(mm, dtype=record_dtype, count=count, offset=HEADER_SIZE)
+
+
+def record_sweep(path, names):
+    decks = winmatrix.all_decks(names)
+    floors = winmatrix.all_floors()
+    battle_id = 0
+    with BattleLogWriter(path) as writer:
+        for deck in decks:
+            for tkey, floor in floors:
+                result = tc.simulate_battle(deck, tc.floor_enemies(tkey, floor), tc.floor_scale(floor))
+                writer.write_battle(battle_id, result.events)
+                battle_id += 1
+    return battle_id
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record or inspect binary battle event logs.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    rec = sub.add_parser('record', help="log every deck x tower floor battle")
+    rec.add_argument('path')
+    rec.add_argument('--unlocked', action='store_true', help="only use cards unlocked in the save file")
+    stats = sub.add_parser('stats', help="print event counts of a log")
+    stats.add_argument('path')
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        names = tc.load_save()['unlocked'] if args.unlocked else list(tc.card_data)
+        battles = record_sweep(args.path, tc.clean_deck(names))
+        print(f"{battles} battles -> {args.path}")
+    else:
+        events = read_events(args.path)
+        print(f"{len(events)} events in {len(np.unique(events['battle']))} battles")
+        counts = np.bincount(events['kind'], minlength=len(event_kinds))
+        for kind, count in zip(event_kinds, counts):
+            print(f"  {kind:<7} {count}")
+
+
+if __name__ == "__main__":
+    main()
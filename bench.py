@@ -0,0 +1,275 @@
+"""Headless benchmarks for battle simulation, rendering, menus and save I/O.
+
+    python bench.py [-o bench.json] [--quick] [--only sim,render,menu,save]
+    python bench.py --compare baseline.json [--tolerance 0.15]
+
+Runs under the SDL dummy video driver, inside a temporary directory so real
+saves and caches are untouched. Results are written as JSON: each entry has a
+value, a unit and whether higher or lower is better. With --compare the run is
+checked against a stored result file and the exit status is 1 if any shared
+benchmark got worse by more than the tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import towerclash as tc
+
+GROUPS = ('sim', 'render', 'menu', 'save')
+# Timed runs per throughput benchmark; the best is reported, as it is the least disturbed by other load
+REPEATS = 5
+# Cards per side for the "many cards" render benchmark
+MANY_CARDS = 50
+# Cards unlocked and towers tracked in the large save used for save I/O
+SAVE_CARDS = 5000
+SAVE_TOWERS = 200
+
+representative_decks = {
+    'starter': ['Basic Warrior'] * 4,
+    'burn': ['Flame Tyrant', 'Flame Tyrant', 'Basic Mage', 'Basic Mage'],
+    'revive': ['Crimson Vampire', 'Berserker Shinigami', 'Crimson Vampire', 'Berserker Shinigami'],
+    'late': ['Awakened Shadow Monarch', 'Awakened Sun Deity', 'Eternal Mage', 'Berserker Shinigami'],
+}
+
+
+def rate(fn, min_time):
+    """Calls per second of fn(), the best of REPEATS runs of at least min_time seconds."""
+    rates = []
+    for _ in range(REPEATS):
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            fn()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        rates.append(calls / elapsed)
+    return max(rates)
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def higher(value, unit):
+    return {'value': value, 'unit': unit, 'better': 'higher'}
+
+
+def lower(value, unit):
+    return {'value': value, 'unit': unit, 'better': 'lower'}
+
+
+def bench_sim(results, quick):
+    min_time = 0.1 if quick else 0.5
+    decks = {name: tc.clean_deck(deck) for name, deck in representative_decks.items()}
+    decks = {name: deck for name, deck in decks.items() if deck}
+    floors = [(tkey, floor) for tkey in tc.towers for floor in range(tc.towers[tkey]['floors'])]
+    battles = {(name, tkey, floor): (deck, tc.floor_enemies(tkey, floor), tc.floor_scale(floor))
+               for name, deck in decks.items() for tkey, floor in floors}
+
+    for tkey, floor in floors:
+        matchups = [m for (_, t, f), m in battles.items() if (t, f) == (tkey, floor)]
+        per_sec = rate(lambda: [tc.simulate_battle(*m) for m in matchups], min_time) * len(matchups)
+        results[f'sim/{tkey}/floor{floor + 1}'] = higher(per_sec, 'battles/s')
+    for name in decks:
+        matchups = [m for (n, _, _), m in battles.items() if n == name]
+        per_sec = rate(lambda: [tc.simulate_battle(*m) for m in matchups], min_time) * len(matchups)
+        results[f'sim/deck/{name}'] = higher(per_sec, 'battles/s')
+        per_sec = rate(lambda: [tc.simulate_battle(*m, fast=True) for m in matchups], min_time) * len(matchups)
+        results[f'sim/deck/{name}/fast'] = higher(per_sec, 'battles/s')
+
+
+class BenchClock:
+    """Stands in for pygame's Clock: every tick() advances a fixed dt without
+    sleeping and records the wall time since the previous tick. on_frame(n) is
+    called with the frame number so a benchmark can script input."""
+    def __init__(self, dt_ms, on_frame):
+        self.dt_ms = dt_ms
+        self.on_frame = on_frame
+        self.frame = 0
+        self.last = None
+        self.frame_times = []
+
+    def tick(self, framerate=0):
+        now = time.perf_counter()
+        if self.last is not None:
+            self.frame_times.append(now - self.last)
+        self.last = now
+        self.on_frame(self.frame)
+        self.frame += 1
+        return self.dt_ms
+
+
+def frame_stats(results, name, frame_times):
+    ms = [1000 * t for t in frame_times]
+    results[f'{name}/p50_ms'] = lower(statistics.median(ms), 'ms')
+    results[f'{name}/p95_ms'] = lower(percentile(ms, 0.95), 'ms')
+
+
+def bench_render(results, quick):
+    pygame = tc.pygame
+    frames = 120 if quick else 400
+    names = tc.card_names
+    sizes = [1, 2, 3, 4, MANY_CARDS]
+    escape = pygame.event.Event(pygame.KEYDOWN, key=pygame.K_ESCAPE, mod=0)
+
+    def on_frame(f):
+        if f == frames:
+            pygame.event.post(escape)
+
+    for n in sizes:
+        deck = [names[i % len(names)] for i in range(n)]
+        clock = tc.clock = BenchClock(50, on_frame)
+        random.seed(0)
+        # Mirror matches last long enough to fill the frame budget
+        tc.run_battle(deck, list(reversed(deck)), 1.0)
+        label = 'many' if n == MANY_CARDS else n
+        frame_stats(results, f'render/{label}v{label}', clock.frame_times)
+
+
+def bench_menu(results, quick):
+    pygame = tc.pygame
+    frames = 120 if quick else 400
+    mouse = [(640, 680)]
+    climb_tower = (300, 385)  # "Climb Tower" on the main menu
+    keep_awake = pygame.event.Event(pygame.USEREVENT)
+
+    def on_frame(f):
+        # A posted event every frame keeps main() out of its idle wait
+        pygame.event.post(keep_awake)
+        if f == frames:
+            mouse[0] = climb_tower
+            pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1, pos=climb_tower))
+        elif f == frames + 1:
+            mouse[0] = (640, 680)
+        elif f == 2 * frames:
+            pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+    clock = tc.clock = BenchClock(16, on_frame)
+    get_pos = pygame.mouse.get_pos
+    pygame.mouse.get_pos = lambda: mouse[0]
+    try:
+        tc.main()
+    except SystemExit:
+        pass
+    finally:
+        pygame.mouse.get_pos = get_pos
+        if tc.save_writer is not None:
+            tc.save_writer.flush()
+        tc.screen = None  # main() quit pygame on the way out
+    frame_stats(results, 'menu/main_menu', clock.frame_times[:frames])
+    frame_stats(results, 'menu/tower_select', clock.frame_times[frames + 1:])
+
+
+def bench_save(results, quick):
+    runs = 10 if quick else 40
+    data = tc.default_save()
+    data['unlocked'] = [f'Card {i}' for i in range(SAVE_CARDS)]
+    data['progress'].update({f'tower{i}': i % 6 - 1 for i in range(SAVE_TOWERS)})
+    save_ms, flush_ms, load_ms = [], [], []
+    for i in range(runs):
+        data['deck'][0] = data['unlocked'][i]
+        start = time.perf_counter()
+        tc.save_game(data)
+        queued = time.perf_counter()
+        tc.save_writer.flush()
+        written = time.perf_counter()
+        tc.load_save()
+        loaded = time.perf_counter()
+        save_ms.append(1000 * (queued - start))
+        flush_ms.append(1000 * (written - start))
+        load_ms.append(1000 * (loaded - written))
+    results['save/save_game_ms'] = lower(statistics.median(save_ms), 'ms')
+    results['save/written_ms'] = lower(statistics.median(flush_ms), 'ms')
+    results['save/load_save_ms'] = lower(statistics.median(load_ms), 'ms')
+
+
+def compare(results, baseline, tolerance):
+    """Print each shared benchmark's change against baseline; returns the regressed names."""
+    regressions = []
+    for name, entry in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None or not base['value']:
+            continue
+        change = (entry['value'] - base['value']) / base['value']
+        worse = -change if entry['better'] == 'higher' else change
+        flag = ''
+        if worse > tolerance:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:<36} {base['value']:>11.3f} -> {entry['value']:>11.3f} {entry['unit']:<10} {change:+7.1%}{flag}")
+    missing = sorted(set(baseline) - set(results))
+    if missing:
+        print(f"not run this time: {', '.join(missing)}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the headless benchmark suite.")
+    parser.add_argument('-o', '--out', default='bench.json')
+    parser.add_argument('--quick', action='store_true', help="shorter runs, for smoke testing")
+    parser.add_argument('--only', default=','.join(GROUPS), help=f"comma-separated groups of {', '.join(GROUPS)}")
+    parser.add_argument('--compare', metavar='BASELINE', help="result file to check for regressions against")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="allowed slowdown as a fraction (default 0.15)")
+    args = parser.parse_args(argv)
+
+    groups = [g for g in args.only.split(',') if g]
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown groups: {', '.join(sorted(unknown))}")
+    out = os.path.abspath(args.out)
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)['results']
+
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            if 'render' in groups or 'menu' in groups:
+                tc.init_display()
+            # menu runs last among the display benchmarks because main() quits pygame
+            for group in GROUPS:
+                if group in groups:
+                    print(f"running {group}...", file=sys.stderr)
+                    globals()[f'bench_{group}'](results, args.quick)
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'pygame': tc.pygame.version.ver if tc.pygame else None,
+            'quick': args.quick,
+        },
+        'results': results,
+    }
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"{len(results)} results -> {out}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions beyond {args.tolerance:.0%}")
+            sys.exit(1)
+        print("no regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Card and tower catalogs, loaded from data files and compiled into a binary cache.
+
+The sources are data/cards.json (a list of cards; a card's position is its id)
+and data/towers.json (a list of towers with one enemy deck per floor). They are
+validated once and compiled into a Catalog of integer ids and flat stat arrays,
+which is written to a cache file next to them: a JSON header line followed by
+the raw array bytes, so loading it never executes anything. Later loads use the
+cache as long as the source files (and the ability list) are unchanged.
+"""
+import json
+import math
+import os
+import sys
+from array import array
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+CARDS_FILE = os.path.join(DATA_DIR, 'cards.json')
+TOWERS_FILE = os.path.join(DATA_DIR, 'towers.json')
+CACHE_FILE = os.path.join(DATA_DIR, 'catalog_cache.bin')
+# Bump when the layout of Catalog changes so old caches are rebuilt
+CACHE_VERSION = 2
+DEFAULT_COLOR = (128, 128, 128)
+
+
+class CatalogError(ValueError):
+    """Raised when a catalog source file is malformed; lists every problem found."""
+
+
+class Catalog:
+    """Compiled catalogs. Cards are indexed by id in the stat arrays; each tower
+    floor is an array of enemy card ids."""
+    def __init__(self, card_names, hp, atk, ability, colors, tower_keys, tower_names,
+                 tower_unlocks, tower_next, floor_enemy_ids):
+        self.card_names = card_names
+        self.card_ids = {name: i for i, name in enumerate(card_names)}
+        self.hp = hp
+        self.atk = atk
+        self.ability = ability
+        self.colors = colors
+        self.tower_keys = tower_keys
+        self.tower_names = tower_names
+        self.tower_unlocks = tower_unlocks
+        self.tower_next = tower_next
+        self.floor_enemy_ids = floor_enemy_ids
+
+
+def _is_number(value):
+    # json.load accepts NaN and Infinity, which no stat should be
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def compile_catalog(cards, towers, ability_names):
+    """Validate parsed cards/towers data and compile it; raises CatalogError."""
+    errors = []
+    ability_codes = {name: code for code, name in enumerate(ability_names)}
+    card_names, colors, seen = [], [], set()
+    hp, atk, ability = array('d'), array('d'), array('b')
+    if not isinstance(cards, list):
+        cards = []
+        errors.append("cards: expected a list of cards")
+    for i, card in enumerate(cards):
+        where = f"cards[{i}]"
+        if not isinstance(card, dict):
+            errors.append(f"{where}: expected an object")
+            continue
+        name = card.get('name')
+        if not isinstance(name, str) or not name:
+            errors.append(f"{where}: missing name")
+            continue
+        where = f"card {name!r}"
+        if name in seen:
+            errors.append(f"{where}: defined twice")
+            continue
+        seen.add(name)
+        if not _is_number(card.get('hp')) or card['hp'] <= 0:
+            errors.append(f"{where}: hp must be a positive number")
+        # A zero-attack front line would never end a battle
+        if not _is_number(card.get('atk')) or card['atk'] <= 0:
+            errors.append(f"{where}: atk must be a positive number")
+        if card.get('ability', 'none') not in ability_codes:
+            errors.append(f"{where}: unknown ability {card.get('ability')!r}")
+        color = card.get('color', DEFAULT_COLOR)
+        if (not isinstance(color, (list, tuple)) or len(color) != 3
+                or not all(isinstance(c, int) and 0 <= c <= 255 for c in color)):
+            errors.append(f"{where}: color must be three integers 0-255")
+            color = DEFAULT_COLOR
+        card_names.append(name)
+        hp.append(card['hp'] if _is_number(card.get('hp')) else 0)
+        atk.append(card['atk'] if _is_number(card.get('atk')) else 0)
+        ability.append(ability_codes.get(card.get('ability', 'none'), 0))
+        colors.append(tuple(color))
+    card_ids = {name: i for i, name in enumerate(card_names)}
+
+    def deck_ids(deck, where):
+        if not isinstance(deck, list) or not deck:
+            errors.append(f"{where}: expected a non-empty list of card names")
+            return array('I')
+        unknown = [n for n in deck if n not in card_ids]
+        if unknown:
+            errors.append(f"{where}: unknown cards {unknown}")
+        return array('I', [card_ids[n] for n in deck if n in card_ids])
+
+    tower_keys, tower_names, tower_unlocks, tower_next, floor_enemy_ids = [], [], [], [], []
+    if not isinstance(towers, list):
+        towers = []
+        errors.append("towers: expected a list of towers")
+    for i, tower in enumerate(towers):
+        if not isinstance(tower, dict) or not isinstance(tower.get('key'), str):
+            errors.append(f"towers[{i}]: expected an object with a key")
+            continue
+        key = tower['key']
+        where = f"tower {key!r}"
+        if key in tower_keys:
+            errors.append(f"{where}: defined twice")
+            continue
+        enemies = tower.get('enemies')
+        if not isinstance(enemies, list) or not enemies:
+            errors.append(f"{where}: needs at least one floor of enemies")
+            enemies = []
+        tower_keys.append(key)
+        tower_names.append(str(tower.get('name', key)))
+        unlock = tower.get('unlock', [])
+        tower_unlocks.append(deck_ids(unlock, f"{where} unlock") if unlock else array('I'))
+        tower_next.append(tower.get('next'))
+        floor_enemy_ids.append([deck_ids(deck, f"{where} floor {f}") for f, deck in enumerate(enemies)])
+    for key, nxt in zip(tower_keys, tower_next):
+        if nxt is not None and nxt not in tower_keys:
+            errors.append(f"tower {key!r}: next tower {nxt!r} does not exist")
+    if not tower_keys:
+        errors.append("towers: at least one tower is required")
+
+    if errors:
+        raise CatalogError("invalid catalog:\n  " + "\n  ".join(errors))
+    return Catalog(card_names, hp, atk, ability, colors, tower_keys, tower_names,
+                   tower_unlocks, tower_next, floor_enemy_ids)
+
+
+def source_signature(paths, ability_names):
+    # JSON-shaped so it compares equal after a round trip through the cache header;
+    # the byte order is included because the arrays are stored in native order
+    stats = [os.stat(path) for path in paths]
+    return [CACHE_VERSION, sys.byteorder, list(ability_names), [[s.st_mtime_ns, s.st_size] for s in stats]]
+
+
+def write_cache(path, signature, catalog):
+    """Write catalog to path atomically as a JSON header line plus array bytes."""
+    ids = array('I')
+    for unlock in catalog.tower_unlocks:
+        ids.extend(unlock)
+    for floors in catalog.floor_enemy_ids:
+        for deck in floors:
+            ids.extend(deck)
+    header = {
+        'signature': signature,
+        'card_names': catalog.card_names,
+        'colors': catalog.colors,
+        'tower_keys': catalog.tower_keys,
+        'tower_names': catalog.tower_names,
+        'tower_next': catalog.tower_next,
+        'unlock_lengths': [len(unlock) for unlock in catalog.tower_unlocks],
+        'floor_lengths': [[len(deck) for deck in floors] for floors in catalog.floor_enemy_ids],
+        'id_count': len(ids),
+    }
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(json.dumps(header).encode() + b'\n')
+        for arr in (catalog.hp, catalog.atk, catalog.ability, ids):
+            f.write(arr.tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_cache(path, signature):
+    """The cached Catalog, or None if the cache is missing, stale or unreadable."""
+    try:
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline())
+            if header['signature'] != signature:
+                return None
+            count = len(header['card_names'])
+
+            def read_array(typecode, n):
+                arr = array(typecode)
+                data = f.read(n * arr.itemsize)
+                if len(data) != n * arr.itemsize:
+                    raise ValueError("truncated catalog cache")
+                arr.frombytes(data)
+                return arr
+
+            hp, atk, ability = read_array('d', count), read_array('d', count), read_array('b', count)
+            ids = read_array('I', header['id_count'])
+        pos = 0
+
+        def take(n):
+            nonlocal pos
+            pos += n
+            return ids[pos - n:pos]
+
+        tower_unlocks = [take(n) for n in header['unlock_lengths']]
+        floor_enemy_ids = [[take(n) for n in floors] for floors in header['floor_lengths']]
+        return Catalog(header['card_names'], hp, atk, ability, [tuple(c) for c in header['colors']],
+                       header['tower_keys'], header['tower_names'], tower_unlocks, header['tower_next'],
+                       floor_enemy_ids)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def load_catalog(ability_names, cards_path=CARDS_FILE, towers_path=TOWERS_FILE, cache_path=CACHE_FILE):
+    """Load the compiled catalog, rebuilding the cache if a source file changed."""
+    signature = source_signature([cards_path, towers_path], ability_names)
+    catalog = read_cache(cache_path, signature)
+    if catalog is not None:
+        return catalog
+
+    def read(path):
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except ValueError as e:
+            raise CatalogError(f"{path}: {e}") from None
+
+    catalog = compile_catalog(read(cards_path), read(towers_path), ability_names)
+    try:
+        write_cache(cache_path, signature, catalog)
+    except OSError:
+        pass  # a read-only install still works, it just compiles on every start
+    return catalog
@@ -0,0 +1 @@
+# Lets plain `pytest` from the repo root import the top-level modules, as `python -m pytest` does
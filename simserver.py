@@ -0,0 +1,247 @@
+"""Local battle-simulation service, so tools can get battle results without the game loop.
+
+    python simserver.py --unix /tmp/towerclash.sock [--workers N]
+    python simserver.py [--host 127.0.0.1] [--port 8765] [--workers N]
+
+The protocol is newline-delimited JSON. A request lists matchups, each either
+an explicit enemy deck or a tower floor (floor is 0-based; scale defaults to
+1.0, or to the floor's scale for tower matchups):
+
+    {"id": 7, "matchups": [{"deck": ["Flame Tyrant", "Basic Mage"], "enemy": ["Crimson Vampire"], "scale": 1.3},
+                           {"deck": ["Eternal Mage"], "tower": "tower2", "floor": 3}]}
+
+Results stream back one line per matchup as soon as it is resolved, in
+completion order, followed by a final line for the request:
+
+    {"id": 7, "index": 1, "victory": true, "turns": 9, "steps": 27, "player_hp": 210.0, "enemy_hp": 0.0}
+    {"id": 7, "index": 0, "error": "empty or invalid deck"}
+    {"id": 7, "index": 2, "error": "battle undecided after 100000 turns"}
+    {"id": 7, "done": true, "count": 2}
+
+Requests on one connection are served concurrently. Matchups from every
+connection share one bounded queue; a batcher groups them into batches for a
+process pool running towerclash.simulate_battle. Identical matchups that are
+already queued or running share a single simulation. When the queue is full,
+the server stops reading from clients until it drains.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import signal
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import towerclash as tc
+
+# Matchups waiting for a worker; when full, clients are not read from
+QUEUE_SIZE = 4096
+BATCH_SIZE = 64
+# Seconds a partial batch waits for more matchups before it is sent to the pool
+BATCH_DELAY = 0.005
+# Longest request line accepted
+MAX_REQUEST_BYTES = 16 << 20
+# Turns after which a battle is reported as undecided, so no matchup can hold a worker forever
+MAX_TURNS = 100_000
+
+
+def parse_matchup(spec):
+    """(deck, enemy deck, scale) for one request matchup; raises ValueError if malformed."""
+    if not isinstance(spec, dict):
+        raise ValueError("matchup must be an object")
+    deck = spec.get('deck')
+    if not isinstance(deck, list):
+        raise ValueError("deck must be a list of card names")
+    if 'tower' in spec:
+        tkey, floor = spec['tower'], spec.get('floor', 0)
+        if tkey not in tc.towers:
+            raise ValueError(f"unknown tower {tkey!r}")
+        if not isinstance(floor, int) or isinstance(floor, bool) or not 0 <= floor < tc.towers[tkey]['floors']:
+            raise ValueError(f"{tkey} has no floor {floor!r}")
+        enemy = tc.floor_enemies(tkey, floor)
+        scale = spec.get('scale', tc.floor_scale(floor))
+    else:
+        enemy = spec.get('enemy')
+        if not isinstance(enemy, list):
+            raise ValueError("enemy must be a list of card names, or give tower and floor")
+        scale = spec.get('scale', 1.0)
+    # json.loads accepts NaN and Infinity
+    if not isinstance(scale, (int, float)) or isinstance(scale, bool) or not math.isfinite(scale) or scale <= 0:
+        raise ValueError("scale must be a positive, finite number")
+    return tuple(tc.clean_deck(deck)), tuple(tc.clean_deck(enemy)), float(scale)
+
+
+def init_worker():
+    # Ctrl-C reaches the whole process group; the server shuts the pool down itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def play_batch(matchups):
+    """Runs in a pool worker. A result dict per matchup, or None for an empty deck."""
+    results = []
+    for p_deck, e_deck, scale in matchups:
+        r = tc.simulate_battle(p_deck, e_deck, scale, fast=True, max_turns=MAX_TURNS)
+        if r is not None and r.victory is None:
+            results.append({'error': f"battle undecided after {MAX_TURNS} turns"})
+            continue
+        results.append(None if r is None else {
+            'victory': r.victory, 'turns': r.turns, 'steps': r.steps,
+            'player_hp': r.player_hp, 'enemy_hp': r.enemy_hp,
+        })
+    return results
+
+
+class SimServer:
+    def __init__(self, workers=None, batch_size=BATCH_SIZE, queue_size=QUEUE_SIZE):
+        self.workers = workers or os.cpu_count()
+        self.batch_size = batch_size
+        self.pool = ProcessPoolExecutor(self.workers, initializer=init_worker)
+        self.queue = asyncio.Queue(queue_size)
+        self.inflight = {}  # matchup -> future shared by every request waiting for it
+        # Batches handed to the pool at once; the batcher waits for a free slot
+        self.slots = asyncio.Semaphore(2 * self.workers)
+        self.batches = set()
+
+    async def submit(self, matchup):
+        future = self.inflight.get(matchup)
+        if future is None:
+            future = self.inflight[matchup] = asyncio.get_running_loop().create_future()
+            await self.queue.put(matchup)
+        return future
+
+    async def run_batches(self):
+        while True:
+            batch = [await self.queue.get()]
+            if self.queue.qsize() < self.batch_size - 1:
+                await asyncio.sleep(BATCH_DELAY)
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            await self.slots.acquire()
+            task = asyncio.create_task(self._play(batch))
+            self.batches.add(task)
+            task.add_done_callback(self.batches.discard)
+
+    async def _play(self, batch):
+        try:
+            try:
+                results = await asyncio.get_running_loop().run_in_executor(self.pool, play_batch, batch)
+            except Exception as e:
+                results = [e] * len(batch)
+            for matchup, result in zip(batch, results):
+                future = self.inflight.pop(matchup)
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        finally:
+            self.slots.release()
+
+    async def stream(self, req_id, entries, send):
+        async def one(index, entry):
+            if isinstance(entry, str):
+                await send({'id': req_id, 'index': index, 'error': entry})
+                return
+            try:
+                # Shielded so a client leaving does not cancel a result others share
+                result = await asyncio.shield(entry)
+            except Exception as e:
+                await send({'id': req_id, 'index': index, 'error': f"simulation failed: {e}"})
+                return
+            if result is None:
+                await send({'id': req_id, 'index': index, 'error': "empty or invalid deck"})
+            else:
+                await send({'id': req_id, 'index': index, **result})
+
+        await asyncio.gather(*(one(i, entry) for i, entry in enumerate(entries)))
+        await send({'id': req_id, 'done': True, 'count': len(entries)})
+
+    async def handle(self, reader, writer):
+        lock = asyncio.Lock()
+        requests = set()
+
+        async def send(message):
+            async with lock:
+                writer.write(json.dumps(message).encode() + b'\n')
+                await writer.drain()
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    await send({'error': f"request longer than {MAX_REQUEST_BYTES} bytes"})
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    specs = request['matchups']
+                    if not isinstance(specs, list):
+                        raise TypeError
+                except (ValueError, KeyError, TypeError):
+                    await send({'error': "bad request: expected {\"id\": ..., \"matchups\": [...]}"})
+                    continue
+                req_id = request.get('id')
+                entries = []
+                for spec in specs:
+                    try:
+                        entries.append(await self.submit(parse_matchup(spec)))
+                    except ValueError as e:
+                        entries.append(str(e))
+                task = asyncio.create_task(self.stream(req_id, entries, send))
+                requests.add(task)
+                task.add_done_callback(requests.discard)
+            if requests:
+                await asyncio.gather(*requests)
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            # Server shutdown; returning normally keeps asyncio from logging the cancelled handler
+            pass
+        finally:
+            for task in requests:
+                task.cancel()
+            writer.close()
+
+    async def serve(self, unix=None, host='127.0.0.1', port=8765):
+        batcher = asyncio.create_task(self.run_batches())
+        if unix:
+            server = await asyncio.start_unix_server(self.handle, path=unix, limit=MAX_REQUEST_BYTES)
+            where = unix
+        else:
+            server = await asyncio.start_server(self.handle, host, port, limit=MAX_REQUEST_BYTES)
+            where = ', '.join(str(sock.getsockname()[:2]) for sock in server.sockets)
+        print(f"Simulating with {self.workers} workers, listening on {where}", file=sys.stderr)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve battle simulations over a local socket.")
+    parser.add_argument('--unix', metavar='PATH', help="listen on a Unix socket instead of TCP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="matchups per work item")
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE, help="matchups waiting before clients are throttled")
+    args = parser.parse_args(argv)
+
+    server = SimServer(args.workers, args.batch_size, args.queue_size)
+    try:
+        asyncio.run(server.serve(args.unix, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.pool.shutdown(cancel_futures=True)
+        if args.unix and os.path.exists(args.unix):
+            os.remove(args.unix)
+
+
+if __name__ == "__main__":
+    main()
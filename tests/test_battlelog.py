@@ -0,0 +1,57 @@
+"""Battle event logs must read back exactly what was written."""
+import battlelog
+import towerclash as tc
+
+
+def battle_events(deck, floor):
+    return tc.simulate_battle(deck, tc.floor_enemies('tower1', floor), tc.floor_scale(floor)).events
+
+
+def as_tuples(records):
+    return [(int(r['turn']), tc.PHASES[r['phase']], battlelog.event_kinds[r['kind']],
+             int(r['side']), int(r['slot']), int(r['target_side']), int(r['target_slot']), float(r['amount']))
+            for r in records]
+
+
+def packed(events):
+    side = battlelog.side_codes
+    return [(ev.turn, ev.phase, ev.kind, side[ev.side], battlelog.NO_SLOT if ev.slot is None else ev.slot,
+             side[ev.target_side], battlelog.NO_SLOT if ev.target_slot is None else ev.target_slot, ev.amount)
+            for ev in events]
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'events.tcev')
+    battles = [battle_events(['Flame Tyrant', 'Crimson Vampire'], 0), battle_events(['Eternal Mage'], 2)]
+    with battlelog.BattleLogWriter(path) as writer:
+        for battle_id, events in enumerate(battles):
+            writer.write_battle(battle_id, events)
+    records = battlelog.read_events(path)
+    for battle_id, events in enumerate(battles):
+        assert as_tuples(records[records['battle'] == battle_id]) == packed(events)
+
+
+def test_append_continues_battle_ids(tmp_path):
+    path = str(tmp_path / 'events.tcev')
+    events = battle_events(['Basic Mage'], 1)
+    with battlelog.BattleLogWriter(path) as writer:
+        writer.write_battle(0, events)
+        writer.write_battle(1, events)
+    # An interrupted writer can leave half a record behind
+    with open(path, 'ab') as f:
+        f.write(b'\0' * (battlelog.record_struct.size // 2))
+
+    with battlelog.BattleLogWriter(path, append=True) as writer:
+        assert writer.next_battle_id == 2
+        writer.write_battle(writer.next_battle_id, events)
+    records = battlelog.read_events(path)
+    assert sorted(set(records['battle'].tolist())) == [0, 1, 2]
+    assert as_tuples(records[records['battle'] == 2]) == packed(events)
+
+
+def test_append_to_missing_file_starts_a_new_log(tmp_path):
+    path = str(tmp_path / 'events.tcev')
+    with battlelog.BattleLogWriter(path, append=True) as writer:
+        assert writer.next_battle_id == 0
+        writer.write_battle(0, battle_events(['Basic Warrior'], 0))
+    assert len(battlelog.read_events(path)) > 0
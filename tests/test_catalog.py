@@ -0,0 +1,74 @@
+"""The compiled catalog cache must load back the same catalog and go stale with its sources."""
+import json
+import os
+
+import pytest
+
+import catalog
+import towerclash as tc
+
+
+@pytest.fixture
+def sources(tmp_path):
+    cards = tmp_path / 'cards.json'
+    towers = tmp_path / 'towers.json'
+    cards.write_text(open(catalog.CARDS_FILE).read())
+    towers.write_text(open(catalog.TOWERS_FILE).read())
+    return str(cards), str(towers), str(tmp_path / 'catalog_cache.bin')
+
+
+def load(sources):
+    cards, towers, cache = sources
+    return catalog.load_catalog(tc.ability_names, cards, towers, cache)
+
+
+def test_cache_round_trip(sources):
+    compiled = load(sources)
+    assert os.path.exists(sources[2])
+    cached = catalog.read_cache(sources[2], catalog.source_signature(sources[:2], tc.ability_names))
+    assert cached is not None
+    assert vars(cached) == vars(compiled)
+    assert vars(compiled) == vars(tc.catalog)
+
+
+def test_changed_source_invalidates_cache(sources):
+    load(sources)
+    cards = json.load(open(sources[0]))
+    cards.append({'name': 'Test Golem', 'hp': 900, 'atk': 5})
+    with open(sources[0], 'w') as f:
+        json.dump(cards, f)
+    assert 'Test Golem' in load(sources).card_ids
+
+
+def test_changed_abilities_invalidate_cache(sources):
+    load(sources)
+    stale = catalog.source_signature(sources[:2], tc.ability_names + ['extra'])
+    assert catalog.read_cache(sources[2], stale) is None
+
+
+@pytest.mark.parametrize('damage', [b'', b'{"signature": [', b'not a header\n'], ids=['empty', 'bad header', 'not json'])
+def test_damaged_cache_is_rebuilt(sources, damage):
+    expected = vars(load(sources))
+    with open(sources[2], 'wb') as f:
+        f.write(damage)
+    assert vars(load(sources)) == expected
+
+
+def test_truncated_cache_is_rebuilt(sources):
+    expected = vars(load(sources))
+    size = os.path.getsize(sources[2])
+    with open(sources[2], 'r+b') as f:
+        f.truncate(size - 3)
+    signature = catalog.source_signature(sources[:2], tc.ability_names)
+    assert catalog.read_cache(sources[2], signature) is None
+    assert vars(load(sources)) == expected
+
+
+def test_invalid_cards_are_reported():
+    cards = [{'name': 'A', 'hp': 10, 'atk': 0}, {'name': 'A', 'hp': 10, 'atk': 1}, {'name': 'B', 'hp': float('nan'), 'atk': 1}]
+    towers = [{'key': 't', 'enemies': [['A', 'Nobody']]}]
+    with pytest.raises(catalog.CatalogError) as err:
+        catalog.compile_catalog(cards, towers, tc.ability_names)
+    message = str(err.value)
+    for problem in ("atk must be a positive number", "defined twice", "hp must be a positive number", "unknown cards"):
+        assert problem in message
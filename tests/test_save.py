@@ -0,0 +1,59 @@
+"""Saves are written atomically with a backup, and damaged saves fall back to it."""
+import json
+
+import pytest
+
+import towerclash as tc
+
+
+@pytest.fixture
+def save_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def sample_save(floor=0):
+    data = tc.default_save()
+    data['unlocked'].append('Flame Tyrant')
+    data['deck'][0] = 'Flame Tyrant'
+    data['progress']['tower1'] = floor
+    return data
+
+
+def write(path, data):
+    path.write_text(json.dumps(data) if not isinstance(data, str) else data)
+
+
+def test_writer_keeps_previous_save_as_backup(save_dir):
+    writer = tc.SaveWriter()
+    writer.save(sample_save(1))
+    assert writer.flush(5)
+    writer.save(sample_save(2))
+    assert writer.flush(5)
+    assert tc.read_save_file(tc.SAVE_FILE) == sample_save(2)
+    assert tc.read_save_file(tc.SAVE_BACKUP_FILE) == sample_save(1)
+    assert not (save_dir / (tc.SAVE_FILE + '.tmp')).exists()
+
+
+@pytest.mark.parametrize('damaged', [
+    '{"unlocked": ["Basic Warrior"], "deck": [',
+    {'unlocked': ['Basic Warrior'], 'deck': ['Basic Warrior'], 'progress': {}},
+    {'unlocked': ['Basic Warrior'], 'deck': ['Basic Warrior'] * 4, 'progress': {'tower1': 99}},
+    {'unlocked': 'Basic Warrior', 'deck': ['Basic Warrior'] * 4, 'progress': {}},
+], ids=['truncated', 'short deck', 'progress past top floor', 'wrong type'])
+def test_damaged_save_falls_back_to_backup(save_dir, damaged):
+    write(save_dir / tc.SAVE_FILE, damaged)
+    write(save_dir / tc.SAVE_BACKUP_FILE, sample_save(3))
+    assert tc.load_save() == sample_save(3)
+
+
+def test_no_usable_save_gives_defaults(save_dir):
+    write(save_dir / tc.SAVE_FILE, 'not json')
+    assert tc.load_save() == tc.default_save()
+
+
+def test_missing_towers_are_added_locked(save_dir):
+    data = sample_save(2)
+    del data['progress']['tower3']
+    write(save_dir / tc.SAVE_FILE, data)
+    assert tc.load_save()['progress']['tower3'] == -1
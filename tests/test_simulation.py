@@ -0,0 +1,59 @@
+"""The batch simulator and the fast-forward resolver must reproduce BattleEngine's results exactly."""
+import itertools
+import random
+
+import pytest
+
+import batchsim
+import towerclash as tc
+
+
+def floor_matchups():
+    """Every four-card deck against every tower floor."""
+    floors = [(tkey, floor) for tkey in tc.towers for floor in range(tc.towers[tkey]['floors'])]
+    return [(list(deck), tc.floor_enemies(tkey, floor), tc.floor_scale(floor))
+            for deck in itertools.combinations_with_replacement(tc.card_names, 4)
+            for tkey, floor in floors]
+
+
+def random_matchups(count=2000, seed=1):
+    """Uneven decks of one to eight cards at assorted scales."""
+    rng = random.Random(seed)
+    names = tc.card_names
+    return [([rng.choice(names) for _ in range(rng.randint(1, 8))],
+             [rng.choice(names) for _ in range(rng.randint(1, 8))],
+             rng.choice([0.5, 1.0, 1.3, 2.2, 7.0]))
+            for _ in range(count)]
+
+
+def outcome(result):
+    return (result.victory, result.turns, result.steps, result.player_hp, result.enemy_hp)
+
+
+@pytest.mark.parametrize('matchups', [floor_matchups(), random_matchups()], ids=['floors', 'random'])
+def test_batch_matches_engine(matchups):
+    batch = batchsim.simulate_batch(matchups)
+    for i, (p_deck, e_deck, scale) in enumerate(matchups):
+        expected = outcome(tc.simulate_battle(p_deck, e_deck, scale))
+        got = (bool(batch.victory[i]), int(batch.turns[i]), int(batch.steps[i]),
+               float(batch.player_hp[i]), float(batch.enemy_hp[i]))
+        assert got == expected, (p_deck, e_deck, scale)
+
+
+@pytest.mark.parametrize('matchups', [floor_matchups(), random_matchups()], ids=['floors', 'random'])
+def test_fast_matches_engine(matchups):
+    for p_deck, e_deck, scale in matchups:
+        expected = outcome(tc.simulate_battle(p_deck, e_deck, scale))
+        assert outcome(tc.simulate_battle(p_deck, e_deck, scale, fast=True)) == expected, (p_deck, e_deck, scale)
+
+
+@pytest.mark.parametrize('scale', [float('inf'), 1e308, float('nan')])
+def test_fast_ends_on_non_finite_stats(scale):
+    expected = tc.simulate_battle(['Basic Mage'], ['Basic Mage'], scale)
+    result = tc.simulate_battle(['Basic Mage'], ['Basic Mage'], scale, fast=True)
+    assert (result.victory, result.turns, result.steps) == (expected.victory, expected.turns, expected.steps)
+
+
+def test_batch_marks_empty_decks_invalid():
+    batch = batchsim.simulate_batch([([], ['Basic Mage'], 1.0), (['Basic Mage'], ['Basic Mage'], 1.0)])
+    assert list(batch.valid) == [False, True]
@@ -1,22 +1,65 @@
-import pygame
+import atexit
+import bisect
+import csv
+import hashlib
 import json
 import os
+import queue
+import sqlite3
 import random
 import math
-from collections import deque
+from array import array
+from collections import OrderedDict, deque, namedtuple
 import sys
+import threading
+import time
+
+from catalog import load_catalog
 
 # pygame-ce should be installed → pip install pygame-ce
+# pygame is imported and the window/fonts are created by init_display(), so
+# importing this module for the battle rules needs no display.
+pygame = None
 
-pygame.init()
 SCREEN_WIDTH = 1200
 SCREEN_HEIGHT = 700
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Tower Clash - Visual Battles!")
-clock = pygame.time.Clock()
-font = pygame.font.Font(None, 48)
-med_font = pygame.font.Font(None, 36)
-small_font = pygame.font.Font(None, 24)
+screen = None
+clock = None
+font = None
+med_font = None
+small_font = None
+# Recording of the most recent run_battle(), for "Replay Last Battle"
+last_recording = None
+
+def init_display():
+    global pygame, screen, clock, font, med_font, small_font
+    if screen is not None:
+        return
+    import pygame
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("Tower Clash - Visual Battles!")
+    clock = pygame.time.Clock()
+    font = pygame.font.Font(None, 48)
+    med_font = pygame.font.Font(None, 36)
+    small_font = pygame.font.Font(None, 24)
+    card_art.start()
+
+# Rendered text surfaces, keyed by (font, text, colour); least recently used are evicted
+TEXT_CACHE_SIZE = 512
+text_cache = OrderedDict()
+
+def render_text(fnt, text, color):
+    key = (fnt, text, color)
+    surf = text_cache.get(key)
+    if surf is None:
+        surf = fnt.render(text, True, color)
+        text_cache[key] = surf
+        if len(text_cache) > TEXT_CACHE_SIZE:
+            text_cache.popitem(last=False)
+    else:
+        text_cache.move_to_end(key)
+    return surf
 
 # Colors
 WHITE = (255, 255, 255)
@@ -31,43 +74,996 @@ PURPLE = (200, 100, 255)
 YELLOW = (255, 255, 0)
 
 SAVE_FILE = 'save.json'
+# Previous good save, used if save.json is missing or damaged
+SAVE_BACKUP_FILE = 'save.json.bak'
+BATTLE_CACHE_FILE = 'battle_cache.sqlite'
+# Push only changed screen regions instead of flipping the whole frame
+DIRTY_RECTS = os.environ.get('TOWERCLASH_DIRTY_RECTS') == '1'
+# Menus stop redrawing after IDLE_AFTER seconds without input and wait for events,
+# waking at least every IDLE_WAIT_MS to pick up hover changes
+IDLE_AFTER = 2.0
+IDLE_WAIT_MS = 500
+# Card rows that fit on the battle screen; longer decks scroll
+VISIBLE_SLOTS = 4
+# Turns between card-state keyframes in battle recordings
+KEYFRAME_INTERVAL = 10
+# Replay speed multipliers selectable with +/-
+REPLAY_SPEEDS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0)
+# Custom mass battles repeat both decks this many times
+MASS_BATTLE_COPIES = 50
+# Most whole turns BattleEngine.fast_forward() skips in one call
+FAST_FORWARD_MAX_SKIP = 1 << 20
+# Most damage pop-ups alive at once across all cards; extra hits get no pop-up
+POPUP_BUDGET = int(os.environ.get('TOWERCLASH_POPUP_BUDGET', '256'))
+# Card art atlas pages built by atlas.py; art is pre-scaled to the card face size
+ATLAS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'atlas')
+CARD_ART_SIZE = (100, 200)
+# Atlas pages, art subsurfaces and baked card faces kept in memory at most
+ATLAS_PAGE_CACHE = 4
+CARD_ART_CACHE = 256
+CARD_FACE_CACHE = 256
+# Frames a decoded but unused (prefetched) atlas page is kept before it is dropped
+ATLAS_PREFETCH_FRAMES = 120
+# Frame profiler (F3 toggles it, F4 exports its samples): frames kept in its ring buffers,
+# whether it starts enabled, and the export file (.csv or .json)
+PROFILE_FRAMES = 600
+PROFILE = os.environ.get('TOWERCLASH_PROFILE') == '1'
+PROFILE_EXPORT = os.environ.get('TOWERCLASH_PROFILE_EXPORT', 'profile.csv')
+# Binary event log (see battlelog.py) that every resolved battle is appended to
+EVENT_LOG = os.environ.get('TOWERCLASH_EVENT_LOG')
+
+PHASES = ('status', 'player', 'enemy')
+
+# Parts of a frame timed by FrameProfiler. Battles are resolved up front ('resolve',
+# charged to a battle's first frame); the sim_* sections time replaying each phase's events
+PROFILE_SECTIONS = ('events', 'resolve', 'update', 'sim_status', 'sim_player', 'sim_enemy', 'draw', 'hud', 'flip')
+(PROF_EVENTS, PROF_RESOLVE, PROF_UPDATE, PROF_SIM_STATUS, PROF_SIM_PLAYER, PROF_SIM_ENEMY,
+ PROF_DRAW, PROF_HUD, PROF_FLIP) = range(len(PROFILE_SECTIONS))
+prof_sim_sections = (PROF_SIM_STATUS, PROF_SIM_PLAYER, PROF_SIM_ENEMY)  # indexed like PHASES
+
+# Engine events: kind is one of 'burn', 'entry', 'steal', 'attack', 'damage', 'revive', 'death'.
+# side/slot identify the acting card, target_side/target_slot the affected one (or None).
+BattleEvent = namedtuple('BattleEvent', ['turn', 'phase', 'kind', 'side', 'slot', 'target_side', 'target_slot', 'amount'])
+BattleResult = namedtuple('BattleResult', ['victory', 'turns', 'steps', 'player_hp', 'enemy_hp', 'events'])
 
+# Abilities are interned to small integer codes; the rule tables below are indexed by them
+ABILITY_NONE, ABILITY_BURN_AOE, ABILITY_REVIVE, ABILITY_COUNTER, ABILITY_SCALE_DMG, ABILITY_STEAL = range(6)
+ability_names = ['none', 'burn_aoe', 'revive', 'counter', 'scale_dmg', 'steal']
+
+# Card and tower definitions live in data/; catalog compiles them to id-indexed arrays
+catalog = load_catalog(ability_names)
+card_names = catalog.card_names
+card_ids = catalog.card_ids
+card_hp, card_atk, card_ability = catalog.hp, catalog.atk, catalog.ability
 card_data = {
-    'Basic Warrior': {'hp': 150, 'atk': 30, 'ability': 'none', 'color': GRAY},
-    'Basic Mage': {'hp': 100, 'atk': 40, 'ability': 'none', 'color': BLUE},
-    'Flame Tyrant': {'hp': 200, 'atk': 35, 'ability': 'burn_aoe', 'color': ORANGE},
-    'Crimson Vampire': {'hp': 250, 'atk': 25, 'ability': 'revive', 'color': RED},
-    'Awakened Shadow Monarch': {'hp': 400, 'atk': 60, 'ability': 'counter', 'color': PURPLE},
-    'Berserker Shinigami': {'hp': 300, 'atk': 40, 'ability': 'revive', 'color': (200, 0, 0)},
-    'Awakened Sun Deity': {'hp': 500, 'atk': 70, 'ability': 'scale_dmg', 'color': YELLOW},
-    'Eternal Mage': {'hp': 350, 'atk': 50, 'ability': 'steal', 'color': (150, 100, 255)}
+    name: {'hp': card_hp[i], 'atk': card_atk[i], 'ability': ability_names[card_ability[i]], 'color': catalog.colors[i]}
+    for i, name in enumerate(card_names)
 }
+card_colors = dict(zip(card_names, catalog.colors))
 
-card_colors = {name: data['color'] for name, data in card_data.items()}
+def counter_dmg(card, turn):
+    mult = card.dmg_mult
+    if turn % 2 == 0:
+        mult *= 1.75
+    return card.atk * mult
+
+def steal_before_attack(card, emit):
+    if not card.has_stolen:
+        card.has_stolen = True
+        card.atk *= 1.5
+        emit('steal', card, None, card.atk)
+
+def revive_on_lethal(card, emit):
+    if card.revives_used < 1:
+        card.revives_used += 1
+        card.hp = card.max_hp * 0.5
+        emit('revive', card, None, card.hp)
+        return True
+    return False
+
+def burn_aoe_entry(card, enemies, emit):
+    if not card.entry_done and card.alive:
+        card.entry_done = True
+        for enemy in enemies:
+            enemy.burn_dmg = 0.15 * enemy.max_hp
+            emit('entry', card, enemy, enemy.burn_dmg)
+
+# None means the plain atk * dmg_mult, computed inline on the hot path
+dmg_rules = [None] * len(ability_names)
+dmg_rules[ABILITY_COUNTER] = counter_dmg
+before_attack_rules = [None] * len(ability_names)
+before_attack_rules[ABILITY_STEAL] = steal_before_attack
+lethal_rules = [None] * len(ability_names)
+lethal_rules[ABILITY_REVIVE] = revive_on_lethal
+entry_rules = [None] * len(ability_names)
+entry_rules[ABILITY_BURN_AOE] = burn_aoe_entry
+
+class Card:
+    """Simulation state and battle rules for one card. Never touches pygame."""
+    __slots__ = ('name', 'max_hp', 'hp', 'atk', 'ability', 'side', 'alive', 'slot',
+                 'burn_dmg', 'entry_done', 'dmg_mult', 'revives_used', 'has_stolen')
 
-class VisualCard:
     def __init__(self, name, scale=1.0, side='player'):
-        data = card_data[name]
+        cid = card_ids[name]
         self.name = name
-        self.max_hp = data['hp'] * scale
+        self.max_hp = card_hp[cid] * scale
         self.hp = self.max_hp
-        self.atk = data['atk'] * scale
-        self.ability = data['ability']
+        self.atk = card_atk[cid] * scale
+        self.ability = card_ability[cid]
         self.side = side
         self.alive = True
         self.slot = 0
-        self.pos = [0, 0]
-        self.shake_offset = [0, 0]
-        self.dmg_pops = []  # (text, timer, dy)
         self.burn_dmg = 0.0
         self.entry_done = False
         self.dmg_mult = 1.0
         self.revives_used = 0
         self.has_stolen = False
+
+    def take_damage(self, dmg, emit):
+        prev_hp = self.hp
+        self.hp -= dmg
+        emit('damage', None, self, dmg)
+        if self.hp <= 0 and prev_hp > 0:
+            on_lethal = lethal_rules[self.ability]
+            if on_lethal is None or not on_lethal(self, emit):
+                self.alive = False
+                emit('death', self, None, 0.0)
+        self.hp = max(0, self.hp)
+        self.alive = self.hp > 0
+
+    def compute_dmg(self, turn):
+        rule = dmg_rules[self.ability]
+        return self.atk * self.dmg_mult if rule is None else rule(self, turn)
+
+    def attack(self, target, turn, emit):
+        if not self.alive or not target.alive:
+            return
+        rule = dmg_rules[self.ability]
+        dmg = self.atk * self.dmg_mult if rule is None else rule(self, turn)
+        before_attack = before_attack_rules[self.ability]
+        if before_attack is not None:
+            before_attack(self, emit)
+        emit('attack', self, target, dmg)
+        target.take_damage(dmg, emit)
+
+    def apply_entry(self, enemies, emit):
+        on_entry = entry_rules[self.ability]
+        if on_entry is not None:
+            on_entry(self, enemies, emit)
+
+def clean_deck(names):
+    return [n for n in names if isinstance(n, str) and n in card_ids]
+
+class BattleEngine:
+    """Runs the status/player/enemy phase machine of a battle without any display or timing.
+
+    Cards only ever leave the alive set, so each side keeps a front-line index
+    that only moves forward, the cards currently burning, and the cards whose
+    entry effect is still pending. Every action is amortised O(1) in deck size,
+    which keeps mass battles with hundreds of cards per side cheap.
+    """
+    def __init__(self, p_deck_names, e_deck_names, scale=1.0, record_events=True):
+        self.p_cards = [Card(name, scale, 'player') for name in p_deck_names]
+        self.e_cards = [Card(name, scale, 'enemy') for name in e_deck_names]
+        for i, card in enumerate(self.p_cards):
+            card.slot = i
+        for i, card in enumerate(self.e_cards):
+            card.slot = i
+        self.front_idx = {'player': 0, 'enemy': 0}
+        self.burning = []
+        self.pending_entry = [c for c in self.p_cards + self.e_cards if entry_rules[c.ability] is not None]
+        self.turn = 0
+        self.phase = 'status'
+        self.steps = 0
+        self.victory = None  # True/False once the battle is decided
+        self.events = [] if record_events else None
+
+    def emit(self, kind, actor, target, amount):
+        if self.events is None:
+            return
+        self.events.append(BattleEvent(
+            self.turn, self.phase, kind,
+            actor.side if actor else None, actor.slot if actor else None,
+            target.side if target else None, target.slot if target else None,
+            amount))
+
+    def front(self, side):
+        """Lowest-slot alive card of a side, or None once the side is wiped out."""
+        cards = self.p_cards if side == 'player' else self.e_cards
+        i = self.front_idx[side]
+        while i < len(cards) and not cards[i].alive:
+            i += 1
+        self.front_idx[side] = i
+        return cards[i] if i < len(cards) else None
+
+    def _status(self, emit):
+        # Burn ticks, in player-then-enemy slot order like a full scan would give
+        for card in self.burning:
+            if card.alive:
+                emit('burn', card, None, card.burn_dmg)
+                card.take_damage(card.burn_dmg, emit)
+        self.burning = [c for c in self.burning if c.alive]
+        if self.pending_entry:
+            for card in self.pending_entry:
+                enemies = self.e_cards if card.side == 'player' else self.p_cards
+                card.apply_entry([c for c in enemies if c.alive], emit)
+            self.pending_entry = [c for c in self.pending_entry if c.alive and not c.entry_done]
+            self.burning = [c for c in self.p_cards + self.e_cards if c.alive and c.burn_dmg > 0]
+
+    def step(self):
+        """Play a single phase (one 0.8 s action in the visual battle)."""
+        emit = self.emit
+        if self.phase == 'status':
+            self._status(emit)
+            next_phase = 'player'
+
+        elif self.phase == 'player':
+            attacker = self.front('player')
+            target = self.front('enemy')
+            if attacker and target:
+                attacker.attack(target, self.turn, emit)
+            next_phase = 'enemy'
+
+        else:
+            attacker = self.front('enemy')
+            target = self.front('player')
+            if attacker and target:
+                attacker.attack(target, self.turn, emit)
+            next_phase = 'status'
+            self.turn += 1
+
+        self.phase = next_phase
+        self.steps += 1
+        if self.front('enemy') is None:
+            self.victory = True
+        elif self.front('player') is None:
+            self.victory = False
+
+    def run(self, max_turns=None):
+        """Play to the end, or until max_turns turns have passed (victory stays None)."""
+        while self.victory is None and (max_turns is None or self.turn < max_turns):
+            self.step()
+        return self.result()
+
+    def fast_forward(self, max_skip=FAST_FORWARD_MAX_SKIP):
+        """Skip the whole turns before the next state-changing event; returns how many.
+
+        Only HP changes during such a stretch: no card dies or revives, no entry
+        or steal is pending, and the only other variation is the counter parity,
+        which repeats every two turns. HP is advanced with the same float
+        subtractions the engine would do, so the state after the jump matches
+        step-by-step play exactly. Skipped turns emit no events.
+
+        Nothing is skipped when a tracked value is not finite or no tracked card
+        loses HP, and at most max_skip turns are skipped per call.
+        """
+        if self.phase != 'status' or self.victory is not None or self.pending_entry:
+            return 0
+        front_p = self.front('player')
+        front_e = self.front('enemy')
+        if front_p is None or front_e is None:
+            return 0
+        if any(c.ability == ABILITY_STEAL and not c.has_stolen for c in (front_p, front_e)):
+            return 0
+
+        # [card, hp, burn per turn, (hit on even turns, hit on odd turns)]
+        tracks = [[card, card.hp, card.burn_dmg, None] for card in self.burning if card.alive]
+        for card, attacker in ((front_e, front_p), (front_p, front_e)):
+            hits = (attacker.compute_dmg(0), attacker.compute_dmg(1))
+            for track in tracks:
+                if track[0] is card:
+                    track[3] = hits
+                    break
+            else:
+                tracks.append([card, card.hp, None, hits])
+        # NaN never reaches hp <= 0 and a stretch without damage never ends;
+        # step-by-step play handles both, so leave them to it
+        values = [v for _, hp, burn, hits in tracks for v in (hp, burn or 0.0, *(hits or ()))]
+        if not all(math.isfinite(v) for v in values):
+            return 0
+        if not any(burn or (hits and (hits[0] > 0 or hits[1] > 0)) for _, _, burn, hits in tracks):
+            return 0
+
+        turn = self.turn
+        while turn - self.turn < max_skip:
+            parity = turn % 2
+            next_hp = []
+            for card, hp, burn, hits in tracks:
+                if burn is not None:
+                    hp -= burn
+                    if hp <= 0:
+                        break
+                if hits is not None:
+                    hp -= hits[parity]
+                    if hp <= 0:
+                        break
+                next_hp.append(hp)
+            else:
+                for track, hp in zip(tracks, next_hp):
+                    track[1] = hp
+                turn += 1
+                continue
+            break
+
+        skipped = turn - self.turn
+        for card, hp, _, _ in tracks:
+            card.hp = hp
+        self.turn = turn
+        self.steps += 3 * skipped
+        return skipped
+
+    def run_fast(self, max_turns=None):
+        """Like run(), but jumps over quiet stretches with fast_forward()."""
+        while self.victory is None and (max_turns is None or self.turn < max_turns):
+            if max_turns is None:
+                self.fast_forward()
+            else:
+                self.fast_forward(min(FAST_FORWARD_MAX_SKIP, max_turns - self.turn))
+            self.step()
+        return self.result()
+
+    def result(self):
+        return BattleResult(
+            self.victory, self.turn, self.steps,
+            sum(c.hp for c in self.p_cards if c.alive),
+            sum(c.hp for c in self.e_cards if c.alive),
+            self.events)
+
+def simulate_battle(p_deck_names, e_deck_names, scale=1.0, fast=False, max_turns=None):
+    """Resolve a battle to completion. Returns a BattleResult, or None if either deck is empty.
+
+    With fast=True quiet stretches are skipped and the result carries no events.
+    With max_turns set, a battle still undecided after that many turns stops
+    with victory None.
+    """
+    p_deck_names = clean_deck(p_deck_names)
+    e_deck_names = clean_deck(e_deck_names)
+    if not p_deck_names or not e_deck_names:
+        return None
+    if fast:
+        return BattleEngine(p_deck_names, e_deck_names, scale, record_events=False).run_fast(max_turns)
+    return BattleEngine(p_deck_names, e_deck_names, scale).run(max_turns)
+
+def card_stats_hash():
+    """Fingerprint of the card stats that affect battle outcomes."""
+    stats = sorted((name, data['hp'], data['atk'], data['ability']) for name, data in card_data.items())
+    return hashlib.sha1(repr(stats).encode()).hexdigest()[:16]
+
+class BattleCache:
+    """Memoised battle outcomes: an in-memory LRU in front of an sqlite file.
+
+    Entries are stored without their event list. Rows recorded under different
+    card stats are dropped when the cache is opened. resolve() simulates on the
+    calling thread; predict() never blocks and leaves simulating and writing to
+    a background thread, which stores each batch of results in one transaction.
+    """
+    def __init__(self, path=BATTLE_CACHE_FILE, maxsize=4096):
+        self.path = path
+        self.maxsize = maxsize
+        # Key format version plus card stats, so rows from either an older layout or other stats are dropped
+        self.stats_hash = f"2:{card_stats_hash()}"
+        self.memory = OrderedDict()
+        self.db = None
+        self.lock = threading.RLock()
+        self.cond = threading.Condition(self.lock)
+        self.pending = {}  # key -> matchup waiting for the background thread
+        self.thread = None
+
+    def _open(self):
+        if self.db is None:
+            self.db = sqlite3.connect(self.path, check_same_thread=False)
+            # Only a cache: losing the last writes to a crash is fine, an fsync per commit is not
+            self.db.execute("PRAGMA synchronous=OFF")
+            with self.db:
+                self.db.execute(
+                    "CREATE TABLE IF NOT EXISTS outcomes (key TEXT PRIMARY KEY, stats TEXT, "
+                    "victory INTEGER, turns INTEGER, steps INTEGER, player_hp REAL, enemy_hp REAL)")
+                self.db.execute("DELETE FROM outcomes WHERE stats != ?", (self.stats_hash,))
+        return self.db
+
+    def key(self, p_deck_names, e_deck_names, scale):
+        return json.dumps([clean_deck(p_deck_names), clean_deck(e_deck_names), float(scale)])
+
+    def _remember(self, key, result):
+        self.memory[key] = result
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+
+    def _lookup(self, key):
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return self.memory[key]
+        row = self._open().execute(
+            "SELECT victory, turns, steps, player_hp, enemy_hp FROM outcomes WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        result = BattleResult(bool(row[0]), row[1], row[2], row[3], row[4], None)
+        self._remember(key, result)
+        return result
+
+    def _store(self, results):
+        """Write (key, result) pairs in a single transaction and remember them."""
+        rows = [(key, self.stats_hash, int(r.victory), r.turns, r.steps, r.player_hp, r.enemy_hp)
+                for key, r in results]
+        with self.lock:
+            with self._open() as db:
+                db.executemany("INSERT OR REPLACE INTO outcomes VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            for key, result in results:
+                self._remember(key, result)
+
+    def get(self, p_deck_names, e_deck_names, scale=1.0):
+        with self.lock:
+            return self._lookup(self.key(p_deck_names, e_deck_names, scale))
+
+    def resolve(self, p_deck_names, e_deck_names, scale=1.0):
+        """Cached simulate_battle(); the returned BattleResult has events=None."""
+        result = self.get(p_deck_names, e_deck_names, scale)
+        if result is not None:
+            return result
+        result = simulate_battle(p_deck_names, e_deck_names, scale, fast=True)
+        if result is None:
+            return None
+        self._store([(self.key(p_deck_names, e_deck_names, scale), result)])
+        return result
+
+    def predict(self, p_deck_names, e_deck_names, scale=1.0):
+        """Non-blocking resolve(). Returns (done, result): done is False while the
+        background thread is still working on it; result is None for an empty deck."""
+        key = self.key(p_deck_names, e_deck_names, scale)
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return True, self.memory[key]
+            if key not in self.pending:
+                self.pending[key] = (list(p_deck_names), list(e_deck_names), scale)
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._predict_pending, name='battle-cache', daemon=True)
+                    self.thread.start()
+                self.cond.notify()
+        return False, None
+
+    def _predict_pending(self):
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                jobs, self.pending = self.pending, {}
+            simulated = []
+            for key, (p_deck_names, e_deck_names, scale) in jobs.items():
+                with self.lock:
+                    result = self._lookup(key)
+                if result is None:
+                    result = simulate_battle(p_deck_names, e_deck_names, scale, fast=True)
+                    if result is None:
+                        with self.lock:
+                            self._remember(key, None)  # empty deck: nothing to predict
+                        continue
+                    simulated.append((key, result))
+            if simulated:
+                self._store(simulated)
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+def art_slug(name):
+    return name.lower().replace(' ', '_')
+
+class CardArt:
+    """Card art served as subsurfaces of atlas pages built by atlas.py.
+
+    get() never blocks: a page that is not in memory is queued for a background
+    thread to decode, and get() returns None until it is ready so callers can
+    draw placeholder art meanwhile. Decoded pages are converted with
+    convert_alpha() on the main thread the first time they are used. At most
+    max_pages pages and max_sprites subsurfaces are kept; evicting a page also
+    drops its subsurfaces. Pages used in the current or previous frame (see
+    begin_frame()) are never evicted, so a screen needing more than max_pages
+    pages holds them all instead of decoding them again every frame. Decoded
+    pages still waiting to be used count against max_pages too, and are dropped
+    after ATLAS_PREFETCH_FRAMES frames.
+    """
+    def __init__(self, atlas_dir=ATLAS_DIR, max_pages=ATLAS_PAGE_CACHE, max_sprites=CARD_ART_CACHE):
+        self.atlas_dir = atlas_dir
+        self.max_pages = max_pages
+        self.max_sprites = max_sprites
+        self.index = {}  # slug -> (page, x, y)
+        self.page_files = []
+        self.pages = OrderedDict()
+        self.page_frames = {}  # page -> frame it was last used in
+        self.frame = 0
+        self.sprites = OrderedDict()
+        self.decoded = {}  # page -> surface (or None if unreadable), filled by the loader thread
+        self.decoded_frames = {}  # page -> frame its decoded surface was first seen waiting
+        self.requested = set()
+        self.broken = set()
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.thread = None
+
+    def start(self):
+        if self.thread is not None:
+            return
+        try:
+            with open(os.path.join(self.atlas_dir, 'index.json'), 'r') as f:
+                meta = json.load(f)
+            if tuple(meta['size']) == CARD_ART_SIZE:
+                self.page_files = meta['pages']
+                self.index = {slug: tuple(entry) for slug, entry in meta['sprites'].items()}
+            else:
+                print(f"Ignoring card art atlas built for {meta['size']}; rerun atlas.py")
+        except (OSError, ValueError, KeyError):
+            pass  # no atlas built: every card keeps its placeholder art
+        self.thread = threading.Thread(target=self._load_pages, name='card-art-loader', daemon=True)
+        self.thread.start()
+
+    def _load_pages(self):
+        while True:
+            page = self.queue.get()
+            try:
+                surf = pygame.image.load(os.path.join(self.atlas_dir, self.page_files[page]))
+            except (OSError, pygame.error):
+                surf = None
+            with self.lock:
+                self.decoded[page] = surf
+
+    def _request(self, page):
+        if page not in self.requested:
+            self.requested.add(page)
+            self.queue.put(page)
+
+    def prefetch(self, names):
+        """Start decoding the pages holding these cards' art."""
+        for name in set(names):
+            entry = self.index.get(art_slug(name))
+            if entry is not None and entry[0] not in self.pages:
+                self._request(entry[0])
+
+    def begin_frame(self):
+        self.frame += 1
+        if len(self.pages) > self.max_pages:
+            self._evict()
+        with self.lock:
+            waiting = list(self.decoded)
+        if not waiting:
+            return
+        for page in waiting:
+            self.decoded_frames.setdefault(page, self.frame)
+        # Oldest first; a page that only just arrived gets one frame to be used
+        waiting.sort(key=self.decoded_frames.get)
+        over = len(self.pages) + len(waiting) - self.max_pages
+        for page in waiting:
+            age = self.frame - self.decoded_frames[page]
+            if age > ATLAS_PREFETCH_FRAMES or (over > 0 and age > 0):
+                with self.lock:
+                    self.decoded.pop(page, None)
+                del self.decoded_frames[page]
+                self.requested.discard(page)
+                over -= 1
+
+    def _page(self, page):
+        surf = self.pages.get(page)
+        if surf is not None:
+            self.pages.move_to_end(page)
+            self.page_frames[page] = self.frame
+            return surf
+        if page in self.broken:
+            return None
+        with self.lock:
+            ready = page in self.decoded
+            decoded = self.decoded.pop(page, None)
+        if not ready:
+            self._request(page)
+            return None
+        self.requested.discard(page)
+        self.decoded_frames.pop(page, None)
+        if decoded is None:
+            self.broken.add(page)
+            return None
+        surf = self.pages[page] = decoded.convert_alpha()
+        self.page_frames[page] = self.frame
+        if len(self.pages) > self.max_pages:
+            self._evict()
+        return surf
+
+    def _evict(self):
+        # Least recently used first, skipping pages the screen is still drawing from
+        for old in [p for p in self.pages if self.page_frames[p] < self.frame - 1]:
+            if len(self.pages) <= self.max_pages:
+                break
+            del self.pages[old]
+            del self.page_frames[old]
+            for slug in [s for s in self.sprites if self.index[s][0] == old]:
+                del self.sprites[slug]
+
+    def get(self, name):
+        slug = art_slug(name)
+        sprite = self.sprites.get(slug)
+        if sprite is not None:
+            self.sprites.move_to_end(slug)
+            page = self.index[slug][0]
+            self.pages.move_to_end(page)
+            self.page_frames[page] = self.frame
+            return sprite
+        entry = self.index.get(slug)
+        if entry is None:
+            return None
+        page, x, y = entry
+        surf = self._page(page)
+        if surf is None:
+            return None
+        sprite = self.sprites[slug] = surf.subsurface((x, y) + CARD_ART_SIZE)
+        if len(self.sprites) > self.max_sprites:
+            self.sprites.popitem(last=False)
+        return sprite
+
+card_art = CardArt()
+
+# Static card faces, pre-rendered per (name, colour, has art); least recently used are evicted
+card_faces = OrderedDict()
+# Solid overlay surfaces keyed by (size, colour); their alpha is set per blit
+overlay_surfaces = {}
+
+def get_card_face(name):
+    color = card_colors.get(name, GRAY)
+    art = card_art.get(name)
+    key = (name, color, art is not None)
+    face = card_faces.get(key)
+    if face is not None:
+        card_faces.move_to_end(key)
+    else:
+        name_surf = render_text(small_font, name, BLACK)
+        ab_surf = render_text(small_font, card_data[name]['ability'][:4].upper(), WHITE)
+        # Wide enough for long names, which overhang the 100 px card body
+        width = max(100, name_surf.get_width())
+        cx = width // 2
+        face = pygame.Surface((width, 200), pygame.SRCALPHA)
+        pygame.draw.rect(face, color, (cx - 50, 0, 100, 200), border_radius=12)
+        if art is not None:
+            body = art.copy()
+            corners = pygame.Surface(CARD_ART_SIZE, pygame.SRCALPHA)
+            pygame.draw.rect(corners, WHITE, (0, 0) + CARD_ART_SIZE, border_radius=12)
+            body.blit(corners, (0, 0), special_flags=pygame.BLEND_RGBA_MIN)
+            face.blit(body, (cx - 50, 0))
+        else:
+            # Placeholder circle for card art
+            pygame.draw.circle(face, (255, 220, 180), (cx, 80), 35)
+        pygame.draw.rect(face, WHITE, (cx - 50, 0, 100, 200), 3, border_radius=12)
+        face.blit(name_surf, (cx - name_surf.get_width() // 2, 170))
+        face.blit(ab_surf, (cx - ab_surf.get_width() // 2, 15))
+        face = card_faces[key] = face.convert_alpha()
+        if len(card_faces) > CARD_FACE_CACHE:
+            card_faces.popitem(last=False)
+    return face
+
+def blit_overlay(target, size, color, alpha, pos):
+    key = (size, color)
+    overlay = overlay_surfaces.get(key)
+    if overlay is None:
+        overlay = pygame.Surface(size).convert()
+        overlay.fill(color)
+        overlay_surfaces[key] = overlay
+    overlay.set_alpha(max(0, alpha))
+    target.blit(overlay, pos)
+
+class DirtyRects:
+    """Opt-in dirty-rectangle presenter.
+
+    Each frame, regions that can change are marked with a signature of what
+    they show; present() pushes only the regions whose signature or position
+    differs from the previous frame. Anything drawn outside marked regions is
+    only shown by a full present, so screens call present(full=True) whenever
+    their layout changes. When disabled, present() always flips.
+    """
+    def __init__(self, enabled=None):
+        self.enabled = DIRTY_RECTS if enabled is None else enabled
+        self.prev = {}
+        self.current = {}
+        self.full = True
+
+    def mark(self, key, rect, signature):
+        if self.enabled:
+            self.current[key] = (pygame.Rect(rect), signature)
+
+    def invalidate(self):
+        self.full = True
+
+    def present(self, full=False):
+        if not self.enabled or full or self.full:
+            pygame.display.flip()
+        else:
+            rects = []
+            for key, (rect, signature) in self.current.items():
+                prev = self.prev.get(key)
+                if prev is None:
+                    rects.append(rect)
+                elif prev != (rect, signature):
+                    rects.append(rect.union(prev[0]))
+            for key, (rect, _) in self.prev.items():
+                if key not in self.current:
+                    rects.append(rect)
+            if rects:
+                pygame.display.update(rects)
+        self.prev, self.current = self.current, {}
+        self.full = False
+
+# Pop-up digit glyphs keyed by (character, colour)
+popup_glyphs = {}
+# Glyph runs per damage amount, built once and shared by every pop-up showing it
+POPUP_TEXT_CACHE = 256
+popup_texts = OrderedDict()
+
+def get_popup_glyph(char, color):
+    glyph = popup_glyphs.get((char, color))
+    if glyph is None:
+        glyph = popup_glyphs[(char, color)] = small_font.render(char, True, color).convert_alpha()
+    return glyph
+
+def get_popup_text(amount):
+    """(yellow glyphs, red glyphs, width, height) for a "-<amount>" pop-up."""
+    text = popup_texts.get(amount)
+    if text is None:
+        chars = f"-{amount}"
+        yellow = tuple(get_popup_glyph(ch, YELLOW) for ch in chars)
+        red = tuple(get_popup_glyph(ch, RED) for ch in chars)
+        text = popup_texts[amount] = (yellow, red, sum(g.get_width() for g in yellow), yellow[0].get_height())
+        if len(popup_texts) > POPUP_TEXT_CACHE:
+            popup_texts.popitem(last=False)
+    else:
+        popup_texts.move_to_end(amount)
+    return text
+
+class PopupPool:
+    """Fixed-capacity pool of damage pop-ups shared by every card on screen.
+
+    Pop-ups are rows of preallocated parallel arrays, kept packed in [0, count):
+    an expired row is overwritten by the last live one, so updating, drawing and
+    expiring never allocate. Positions are offsets from the owning card; each
+    row holds the damage amount's glyph run from get_popup_text(), looked up
+    once at spawn. Spawns beyond the capacity are dropped.
+    """
+    LIFETIME = 1.5
+    FADE_AT = 0.7  # pop-ups turn from yellow to red below this much life left
+    RISE_SPEED = 60.0
+
+    def __init__(self, capacity=POPUP_BUDGET):
+        self.capacity = capacity
+        self.x = array('d', bytes(8 * capacity))
+        self.y = array('d', bytes(8 * capacity))
+        self.vx = array('d', bytes(8 * capacity))
+        self.vy = array('d', bytes(8 * capacity))
+        self.life = array('d', bytes(8 * capacity))
+        self.text = [None] * capacity
+        self.owner = [None] * capacity
+        self.count = 0
+        self.dropped = 0
+
+    def spawn(self, owner, amount):
+        i = self.count
+        if i >= self.capacity:
+            self.dropped += 1
+            return
+        self.x[i] = 0.0
+        self.y[i] = -20.0
+        self.vx[i] = 0.0
+        self.vy[i] = -self.RISE_SPEED
+        self.life[i] = self.LIFETIME
+        self.text[i] = get_popup_text(amount)
+        self.owner[i] = owner
+        owner.live_popups += 1
+        self.count = i + 1
+
+    def _remove(self, i):
+        self.owner[i].live_popups -= 1
+        last = self.count - 1
+        if i != last:
+            self.x[i] = self.x[last]
+            self.y[i] = self.y[last]
+            self.vx[i] = self.vx[last]
+            self.vy[i] = self.vy[last]
+            self.life[i] = self.life[last]
+            self.text[i] = self.text[last]
+            self.owner[i] = self.owner[last]
+        self.owner[last] = None
+        self.text[last] = None
+        self.count = last
+
+    def clear(self):
+        while self.count:
+            self._remove(self.count - 1)
+
+    def update(self, dt):
+        x, y, vx, vy, life = self.x, self.y, self.vx, self.vy, self.life
+        i = 0
+        while i < self.count:
+            remaining = life[i] - dt
+            if remaining <= 0:
+                self._remove(i)
+                continue
+            life[i] = remaining
+            x[i] += vx[i] * dt
+            y[i] += vy[i] * dt
+            i += 1
+
+    def draw(self, screen, presenter=None):
+        for i in range(self.count):
+            owner = self.owner[i]
+            yellow, red, width, height = self.text[i]
+            fresh = self.life[i] > self.FADE_AT
+            px = int(owner.pos[0] + owner.shake_offset[0] + self.x[i]) - width // 2
+            py = int(owner.pos[1] + owner.shake_offset[1] + self.y[i])
+            for glyph in yellow if fresh else red:
+                screen.blit(glyph, (px, py))
+                px += glyph.get_width()
+            if presenter is not None:
+                presenter.mark(('popup', i), (px - width, py, width, height), fresh)
+
+# Damage pop-ups of the battle on screen
+popups = PopupPool()
+
+class FrameProfiler:
+    """Per-frame timings of the sections in PROFILE_SECTIONS, kept in ring buffers.
+
+    A frame is begin_frame(), then lap(section) after each part of the frame,
+    then end_frame(). add() charges time measured elsewhere (a replayed
+    phase, or resolving a battle before its first frame) to a section without
+    counting it twice in the next lap. Frames nest: a battle started from a
+    menu frame records its own frames and the menu frame continues timing from
+    where the battle left off. Net block growth is the change in
+    sys.getallocatedblocks() over a frame, so memory allocated and freed
+    within the frame does not show. When disabled every call returns
+    immediately.
+    """
+    def __init__(self, capacity=PROFILE_FRAMES, enabled=None):
+        self.enabled = PROFILE if enabled is None else enabled
+        self.capacity = capacity
+        self.samples = [array('d', bytes(8 * capacity)) for _ in PROFILE_SECTIONS]
+        self.frame_times = array('d', bytes(8 * capacity))
+        self.allocs = array('q', bytes(8 * capacity))
+        self.current = array('d', bytes(8 * len(PROFILE_SECTIONS)))
+        self.frames = 0  # frames recorded so far; the newest is at (frames - 1) % capacity
+        self.last = time.perf_counter()
+        self.blocks = 0
+        self.overlay_lines = ()
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.frames = 0
+        self.current = array('d', bytes(8 * len(PROFILE_SECTIONS)))
+        self.overlay_lines = ()
+
+    def begin_frame(self):
+        if self.enabled:
+            self.last = time.perf_counter()
+            self.blocks = sys.getallocatedblocks()
+
+    def lap(self, section):
+        if self.enabled:
+            now = time.perf_counter()
+            self.current[section] += now - self.last
+            self.last = now
+
+    def add(self, section, seconds):
+        if self.enabled:
+            self.current[section] += seconds
+            self.last += seconds
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        i = self.frames % self.capacity
+        current = self.current
+        # Sections cover the frame from begin_frame() to the last lap, plus added engine time
+        self.frame_times[i] = sum(current)
+        for section, samples in enumerate(self.samples):
+            samples[i] = current[section]
+            current[section] = 0.0
+        self.allocs[i] = sys.getallocatedblocks() - self.blocks
+        self.frames += 1
+
+    def _order(self):
+        """Ring indices of the recorded frames, oldest first."""
+        if self.frames <= self.capacity:
+            return range(self.frames)
+        start = self.frames % self.capacity
+        return [(start + k) % self.capacity for k in range(self.capacity)]
+
+    def summary_lines(self):
+        n = min(self.frames, self.capacity)
+        if not n:
+            return ["profiler: collecting..."]
+        times = sorted(self.frame_times[:n])
+        p50, p95, p99 = (1000 * times[min(n - 1, int(q * n))] for q in (0.5, 0.95, 0.99))
+        lines = [f"frame p50 {p50:.1f} p95 {p95:.1f} p99 {p99:.1f} ms",
+                 f"net block growth/frame {sum(self.allocs[:n]) / n:+.0f}"]
+        for name, samples in zip(PROFILE_SECTIONS, self.samples):
+            lines.append(f"{name:<11}{1000 * sum(samples[:n]) / n:6.2f} ms  max {1000 * max(samples[:n]):6.2f}")
+        return lines
+
+    def draw_overlay(self, screen, presenter=None):
+        if not self.enabled:
+            return
+        # Percentiles need a sort, so the text is refreshed every 15 frames
+        if not self.overlay_lines or self.frames % 15 == 0:
+            self.overlay_lines = tuple(self.summary_lines())
+        rect = pygame.Rect(595, 95, 270, 10 + 20 * len(self.overlay_lines))
+        blit_overlay(screen, rect.size, BLACK, 190, rect.topleft)
+        for i, line in enumerate(self.overlay_lines):
+            screen.blit(render_text(small_font, line, GREEN), (rect.x + 8, rect.y + 6 + 20 * i))
+        if presenter is not None:
+            presenter.mark('profiler', rect, self.overlay_lines)
+
+    def export(self, path=PROFILE_EXPORT):
+        """Write the recorded frames, oldest first, as CSV or (for .json paths) JSON."""
+        columns = ['frame', 'frame_ms', 'net_blocks'] + [f"{name}_ms" for name in PROFILE_SECTIONS]
+        first = max(0, self.frames - self.capacity)
+        rows = [[first + k, round(1000 * self.frame_times[i], 4), self.allocs[i]]
+                + [round(1000 * s[i], 4) for s in self.samples]
+                for k, i in enumerate(self._order())]
+        with open(path, 'w', newline='') as f:
+            if path.endswith('.json'):
+                json.dump({'columns': columns, 'frames': rows}, f)
+            else:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                writer.writerows(rows)
+        print(f"Profile: {len(rows)} frames -> {path}")
+
+profiler = FrameProfiler()
+
+def handle_profiler_key(event, presenter):
+    """F3 toggles the profiler and its overlay, F4 exports the recorded frames."""
+    if event.type != pygame.KEYDOWN:
+        return
+    if event.key == pygame.K_F3:
+        profiler.toggle()
+        presenter.invalidate()
+    elif event.key == pygame.K_F4 and profiler.frames:
+        try:
+            profiler.export()
+        except OSError as e:
+            print(f"Profile export failed: {e}")
+
+def event_card_key(event):
+    """(side, slot) of the card whose state an event changes, or None."""
+    if event.kind in ('damage', 'entry'):
+        return (event.target_side, event.target_slot)
+    if event.kind in ('steal', 'revive', 'death'):
+        return (event.side, event.slot)
+    return None
+
+def apply_event_state(state, event):
+    if event.kind == 'damage':
+        state.hp = max(0, state.hp - event.amount)
+    elif event.kind == 'revive':
+        state.revives_used += 1
+        state.hp = event.amount
+    elif event.kind == 'death':
+        state.alive = False
+        state.hp = 0
+    elif event.kind == 'entry':
+        state.burn_dmg = event.amount
+    elif event.kind == 'steal':
+        state.has_stolen = True
+        state.atk = event.amount
+
+def snapshot_state(state):
+    return (state.hp, state.atk, state.burn_dmg, state.revives_used, state.has_stolen, state.dmg_mult, state.alive)
+
+class VisualCard:
+    """On-screen card. Its displayed state is driven only by replayed engine events."""
+    def __init__(self, name, scale=1.0, side='player'):
+        self.state = Card(name, scale, side)
+        self.name = name
+        self.pos = [0, 0]
+        self.shake_offset = [0, 0]
+        self.live_popups = 0  # rows owned in the shared PopupPool
         self.revive_timer = 0.0
         self.death_timer = 0.0
         self.time = 0.0
-        # self.image = pygame.image.load(f"assets/{name.lower().replace(' ', '_')}.png")  # uncomment when you add images
 
     def update(self, dt):
         self.time += dt
@@ -75,302 +1071,615 @@ class VisualCard:
         self.shake_offset[1] *= 0.85
         self.revive_timer = max(0, self.revive_timer - dt)
         self.death_timer = min(2.0, self.death_timer + dt)
-        self.dmg_pops = [(txt, t - dt, dy + 60 * dt) for txt, t, dy in self.dmg_pops if t > 0]
 
-    def take_damage(self, dmg, attacker=None):
-        prev_hp = self.hp
-        self.hp -= dmg
-        self.dmg_pops.append((f"-{int(dmg)}", 1.5, 0))
-        self.shake_offset = [random.uniform(-15, 15), random.uniform(-10, 10)]
-        if self.hp <= 0 and prev_hp > 0:
-            revived = False
-            if self.ability == 'revive' and self.revives_used < 1:
-                self.revives_used += 1
-                self.hp = self.max_hp * 0.5
-                self.revive_timer = 1.0
-                revived = True
-            if not revived:
-                self.alive = False
-                self.death_timer = 0.0
-        self.hp = max(0, self.hp)
-        self.alive = self.hp > 0
+    def apply_event(self, event, rng=random):
+        apply_event_state(self.state, event)
+        if event.kind == 'damage':
+            popups.spawn(self, int(event.amount))
+            self.shake_offset[0] = rng.uniform(-15, 15)
+            self.shake_offset[1] = rng.uniform(-10, 10)
+        elif event.kind == 'revive':
+            self.revive_timer = 1.0
+        elif event.kind == 'death':
+            self.death_timer = 0.0
 
-    def compute_dmg(self, turn):
-        mult = self.dmg_mult
-        if self.ability == 'counter' and turn % 2 == 0:
-            mult *= 1.75
-        return self.atk * mult
+    def restore(self, snapshot):
+        """Set the displayed state from a keyframe snapshot and drop running effects.
 
-    def attack(self, target, turn, action_log):
-        if not self.alive or not target.alive:
-            return
-        dmg = self.compute_dmg(turn)
-        if self.ability == 'steal' and not self.has_stolen:
-            self.has_stolen = True
-            self.atk *= 1.5
-            action_log.append(f"{self.name} steals power!")
-        target.take_damage(dmg)
-        action_log.append(f"{self.name} attacks {target.name} for {int(dmg)}!")
-
-    def apply_entry(self, enemies, action_log):
-        if self.ability == 'burn_aoe' and not self.entry_done and self.alive:
-            self.entry_done = True
-            for enemy in enemies:
-                enemy.burn_dmg = 0.15 * enemy.max_hp
-            action_log.append(f"{self.name} ignites all enemies!")
+        Pop-ups live in the shared pool, which the caller clears.
+        """
+        state = self.state
+        state.hp, state.atk, state.burn_dmg, state.revives_used, state.has_stolen, state.dmg_mult, state.alive = snapshot
+        self.shake_offset[0] = self.shake_offset[1] = 0
+        self.revive_timer = 0.0
+
+    def is_animating(self):
+        return self.live_popups > 0 or self.revive_timer > 0 \
+            or abs(self.shake_offset[0]) > 0.5 or abs(self.shake_offset[1]) > 0.5
+
+    def dirty_region(self):
+        """Screen area this card can draw into, and a signature of what it shows."""
+        state = self.state
+        face = get_card_face(self.name)  # changes when the card's art finishes loading
+        half_w = max(55, face.get_width() // 2) + 16
+        rect = (self.pos[0] - half_w, self.pos[1] - 125, 2 * half_w, 245)
+        signature = (
+            face, int(self.shake_offset[0]), int(self.shake_offset[1]), int(state.hp), state.alive,
+            int(40 + 30 * abs(math.sin(self.time * 8))) if state.burn_dmg > 0 else 0,
+            int(80 * self.revive_timer))
+        return rect, signature
 
     def draw(self, screen):
+        state = self.state
         x, y = self.pos[0] + self.shake_offset[0], self.pos[1] + self.shake_offset[1]
-        color = card_colors.get(self.name, GRAY)
-        pygame.draw.rect(screen, color, (x - 50, y - 100, 100, 200), border_radius=12)
-        pygame.draw.rect(screen, WHITE, (x - 50, y - 100, 100, 200), 3, border_radius=12)
-        # Placeholder circle for card art
-        pygame.draw.circle(screen, (255, 220, 180), (int(x), int(y - 20)), 35)
-        name_surf = small_font.render(self.name, True, BLACK)
-        screen.blit(name_surf, (x - name_surf.get_width() // 2, y + 70))
+        face = get_card_face(self.name)
+        screen.blit(face, (x - face.get_width() // 2, y - 100))
         # HP bar
         bar_x, bar_y = x - 40, y + 35
         bar_w, bar_h = 80, 12
-        fill_w = (self.hp / self.max_hp) * bar_w if self.max_hp > 0 else 0
+        fill_w = (state.hp / state.max_hp) * bar_w if state.max_hp > 0 else 0
         pygame.draw.rect(screen, RED, (bar_x, bar_y, bar_w, bar_h))
         pygame.draw.rect(screen, GREEN, (bar_x, bar_y, fill_w, bar_h))
         pygame.draw.rect(screen, BLACK, (bar_x, bar_y, bar_w, bar_h), 2)
-        # Ability label
-        ab_surf = small_font.render(self.ability[:4].upper(), True, WHITE)
-        screen.blit(ab_surf, (x - ab_surf.get_width() // 2, y - 85))
-        # Damage popups
-        for txt, t, dy in self.dmg_pops:
-            col = YELLOW if t > 0.7 else RED
-            surf = small_font.render(txt, True, col)
-            screen.blit(surf, (x - surf.get_width() // 2, y - 20 - dy))
         # Burn overlay
-        if self.burn_dmg > 0:
+        if state.burn_dmg > 0:
             alpha = int(40 + 30 * abs(math.sin(self.time * 8)))
-            overlay = pygame.Surface((110, 210), pygame.SRCALPHA)
-            overlay.fill((*RED, alpha))
-            screen.blit(overlay, (x - 55, y - 105))
+            blit_overlay(screen, (110, 210), RED, alpha, (x - 55, y - 105))
         # Revive flash
         if self.revive_timer > 0:
             alpha = int(80 * self.revive_timer)
-            overlay = pygame.Surface((110, 210), pygame.SRCALPHA)
-            overlay.fill((*GREEN, alpha))
-            screen.blit(overlay, (x - 55, y - 105))
+            blit_overlay(screen, (110, 210), GREEN, alpha, (x - 55, y - 105))
         # Dead overlay
-        if not self.alive:
-            overlay = pygame.Surface((110, 210), pygame.SRCALPHA)
-            overlay.fill((GRAY, 120))
-            screen.blit(overlay, (x - 55, y - 105))
+        if not state.alive:
+            blit_overlay(screen, (110, 210), GRAY, 120, (x - 55, y - 105))
 
-def load_save():
-    if os.path.exists(SAVE_FILE):
-        with open(SAVE_FILE, 'r') as f:
-            data = json.load(f)
-            data.setdefault('unlocked', ['Basic Warrior', 'Basic Mage'])
-            data.setdefault('deck', ['Basic Warrior'] * 4)
-            data.setdefault('progress', {'tower1': 0, 'tower2': -1, 'tower3': -1})
-            return data
+def default_save():
     return {
         'unlocked': ['Basic Warrior', 'Basic Mage'],
         'deck': ['Basic Warrior'] * 4,
-        'progress': {'tower1': 0, 'tower2': -1, 'tower3': -1}
+        'progress': {tkey: 0 if i == 0 else -1 for i, tkey in enumerate(towers)}
     }
 
+def read_save_file(path):
+    """Parse and validate one save file; returns None if it is missing or damaged."""
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict):
+        return None
+    defaults = default_save()
+    for key, value in defaults.items():
+        data.setdefault(key, value)
+        if not isinstance(data[key], type(value)):
+            return None
+    if not all(isinstance(name, str) for name in data['unlocked'] + data['deck']):
+        return None
+    # Build Deck indexes four slots, and a tower can be played up to its last floor
+    if len(data['deck']) != len(defaults['deck']):
+        return None
+    for tkey, floor in data['progress'].items():
+        if not isinstance(floor, int) or isinstance(floor, bool):
+            return None
+        if tkey in towers and not -1 <= floor <= towers[tkey]['floors']:
+            return None
+    for tkey in towers:
+        data['progress'].setdefault(tkey, -1)
+    return data
+
+def load_save():
+    # A crash between the two renames in SaveWriter can leave only the backup
+    for path in (SAVE_FILE, SAVE_BACKUP_FILE):
+        data = read_save_file(path)
+        if data is not None:
+            return data
+        if os.path.exists(path):
+            print(f"Ignoring damaged save file {path}")
+    return default_save()
+
+class SaveWriter:
+    """Writes save data on a background thread.
+
+    save() only serialises the data and hands it over; saves queued while a
+    write is in progress are coalesced so only the newest one hits the disk.
+    Each write goes to a temp file that is fsynced and renamed over the save,
+    and the previous save is kept as the backup copy.
+    """
+    def __init__(self, path=SAVE_FILE, backup_path=SAVE_BACKUP_FILE):
+        self.path = path
+        self.backup_path = backup_path
+        self.tmp_path = path + '.tmp'
+        self.pending = None
+        self.writing = False
+        self.error = None
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._drain, name='save-writer', daemon=True)
+        self.thread.start()
+
+    def _write(self, text):
+        with open(self.tmp_path, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if read_save_file(self.path) is not None:
+            os.replace(self.path, self.backup_path)
+        os.replace(self.tmp_path, self.path)
+
+    def _drain(self):
+        while True:
+            with self.cond:
+                while self.pending is None:
+                    self.cond.wait()
+                text, self.pending = self.pending, None
+                self.writing = True
+            try:
+                self._write(text)
+                error = None
+            except OSError as e:
+                error = e
+            with self.cond:
+                self.writing = False
+                self.error = error
+                self.cond.notify_all()
+
+    def save(self, data):
+        text = json.dumps(data)
+        with self.cond:
+            self.pending = text
+            self.cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Block until every queued save is on disk; returns False on timeout."""
+        with self.cond:
+            done = self.cond.wait_for(lambda: self.pending is None and not self.writing, timeout)
+            if self.error is not None:
+                print(f"Saving failed: {self.error}")
+            return done
+
+save_writer = None
+
 def save_game(data):
-    with open(SAVE_FILE, 'w') as f:
-        json.dump(data, f)
+    global save_writer
+    if save_writer is None:
+        save_writer = SaveWriter()
+        atexit.register(save_writer.flush)
+    save_writer.save(data)
 
 towers = {
-    'tower1': {
-        'name': 'Flame Depths', 'floors': 5,
-        'unlock': ['Flame Tyrant', 'Crimson Vampire'],
-        'enemies': [
-            ['Basic Warrior'],
-            ['Basic Warrior', 'Basic Mage'],
-            ['Basic Mage', 'Basic Mage'],
-            ['Basic Warrior', 'Basic Warrior'],
-            ['Basic Warrior', 'Basic Mage', 'Basic Mage']
-        ]
-    },
-    'tower2': {
-        'name': 'Shadow Citadel', 'floors': 5,
-        'unlock': ['Awakened Shadow Monarch', 'Berserker Shinigami'],
-        'enemies': [
-            ['Flame Tyrant'],
-            ['Crimson Vampire', 'Basic Warrior'],
-            ['Flame Tyrant', 'Flame Tyrant'],
-            ['Crimson Vampire', 'Crimson Vampire'],
-            ['Flame Tyrant', 'Crimson Vampire', 'Flame Tyrant']
-        ]
-    },
-    'tower3': {
-        'name': 'Celestial Peak', 'floors': 5,
-        'unlock': ['Awakened Sun Deity', 'Eternal Mage'],
-        'enemies': [
-            ['Awakened Shadow Monarch'],
-            ['Berserker Shinigami', 'Flame Tyrant'],
-            ['Awakened Shadow Monarch', 'Crimson Vampire'],
-            ['Berserker Shinigami', 'Berserker Shinigami'],
-            ['Awakened Shadow Monarch', 'Berserker Shinigami', 'Flame Tyrant', 'Crimson Vampire']
-        ]
+    key: {
+        'name': name, 'floors': len(floors),
+        'unlock': [card_names[i] for i in unlock],
+        'next': nxt,
     }
+    for key, name, floors, unlock, nxt in zip(catalog.tower_keys, catalog.tower_names, catalog.floor_enemy_ids,
+                                              catalog.tower_unlocks, catalog.tower_next)
 }
+floor_enemy_ids = dict(zip(catalog.tower_keys, catalog.floor_enemy_ids))
 
-def run_battle(p_deck_names, e_deck_names, scale=1.0):
-    # Clean decks
-    p_deck_names = [n for n in p_deck_names if isinstance(n, str) and n in card_data]
-    e_deck_names = [n for n in e_deck_names if isinstance(n, str) and n in card_data]
+def floor_scale(floor):
+    return 1.0 + 0.3 * floor
 
-    if not p_deck_names or not e_deck_names:
+def floor_enemies(tkey, floor):
+    return [card_names[i] for i in floor_enemy_ids[tkey][floor]]
+
+def event_log_text(event, cards, prev_event=None):
+    actor = cards.get((event.side, event.slot))
+    target = cards.get((event.target_side, event.target_slot))
+    if event.kind == 'burn':
+        return f"{actor.name} burns for {int(event.amount)}!"
+    if event.kind == 'steal':
+        return f"{actor.name} steals power!"
+    if event.kind == 'attack':
+        return f"{actor.name} attacks {target.name} for {int(event.amount)}!"
+    if event.kind == 'entry':
+        # One line per igniting card, not per burned enemy
+        if prev_event is None or prev_event.kind != 'entry' or prev_event[3:5] != event[3:5]:
+            return f"{actor.name} ignites all enemies!"
+    return None
+
+def replay_event(event, cards, action_log, prev_event=None, rng=random):
+    key = event_card_key(event)
+    if key is not None:
+        cards[key].apply_event(event, rng)
+    text = event_log_text(event, cards, prev_event)
+    if text:
+        action_log.append(text)
+
+class BattleRecording:
+    """A resolved battle plus card-state keyframes every KEYFRAME_INTERVAL turns.
+
+    step_starts[k] is the index of the first event of step k (three steps per
+    turn), so any step can be reached from the nearest earlier keyframe by
+    applying only the events in between.
+    """
+    def __init__(self, p_deck_names, e_deck_names, scale, result):
+        self.p_deck_names = p_deck_names
+        self.e_deck_names = e_deck_names
+        self.scale = scale
+        self.result = result
+        self.events = result.events
+        self.steps = result.steps
+
+        self.step_starts = [0] * (self.steps + 1)
+        idx = 0
+        for step in range(self.steps + 1):
+            self.step_starts[step] = idx
+            key = (step // 3, PHASES[step % 3])
+            while idx < len(self.events) and self.events[idx][:2] == key:
+                idx += 1
+
+        states = {}
+        for side, names in (('player', p_deck_names), ('enemy', e_deck_names)):
+            for i, name in enumerate(names):
+                states[(side, i)] = Card(name, scale, side)
+        self.keyframe_steps = []
+        self.keyframes = []
+        applied = 0
+        for step in range(0, self.steps + 1, 3 * KEYFRAME_INTERVAL):
+            for event in self.events[applied:self.step_starts[step]]:
+                key = event_card_key(event)
+                if key is not None:
+                    apply_event_state(states[key], event)
+            applied = self.step_starts[step]
+            self.keyframe_steps.append(step)
+            self.keyframes.append({key: snapshot_state(s) for key, s in states.items()})
+
+event_log = None
+
+def log_battle_events(events):
+    """Append a resolved battle's events to EVENT_LOG, if it is set."""
+    global EVENT_LOG, event_log
+    if not EVENT_LOG:
+        return
+    try:
+        if event_log is None:
+            import battlelog  # needs NumPy, so only loaded when logging is on
+            event_log = battlelog.BattleLogWriter(EVENT_LOG, append=True)
+            atexit.register(event_log.close)
+        event_log.write_battle(event_log.next_battle_id, events)
+    except (OSError, ValueError) as e:
+        print(f"Battle event log disabled: {e}")
+        EVENT_LOG = None
+
+def record_battle(p_deck_names, e_deck_names, scale=1.0):
+    p_deck_names = clean_deck(p_deck_names)
+    e_deck_names = clean_deck(e_deck_names)
+    result = simulate_battle(p_deck_names, e_deck_names, scale)
+    if result is None:
+        return None
+    log_battle_events(result.events)
+    return BattleRecording(p_deck_names, e_deck_names, scale, result)
+
+class ReplayCursor:
+    """Current step of a BattleRecording, shown on a set of VisualCards."""
+    def __init__(self, recording, cards):
+        self.recording = recording
+        self.cards = cards
+        self.step = 0
+        self.action_log = deque(maxlen=10)
+
+    def advance(self):
+        """Replay the next step with effects; returns the events applied."""
+        rec = self.recording
+        start, end = rec.step_starts[self.step], rec.step_starts[self.step + 1]
+        for i in range(start, end):
+            prev_event = rec.events[i - 1] if i else None
+            # Shake is seeded by event index so replays and seeks look identical
+            replay_event(rec.events[i], self.cards, self.action_log, prev_event, random.Random(i))
+        self.step += 1
+        return rec.events[start:end]
+
+    def seek(self, step):
+        rec = self.recording
+        step = max(0, min(step, rec.steps))
+        k = bisect.bisect_right(rec.keyframe_steps, step) - 1
+        for key, snapshot in rec.keyframes[k].items():
+            self.cards[key].restore(snapshot)
+        popups.clear()
+        for event in rec.events[rec.step_starts[rec.keyframe_steps[k]]:rec.step_starts[step]]:
+            key = event_card_key(event)
+            if key is not None:
+                apply_event_state(self.cards[key].state, event)
+        self.step = step
+        # Rebuild the visible log from the events just before the new position
+        lines = []
+        i = rec.step_starts[step] - 1
+        while i >= 0 and len(lines) < self.action_log.maxlen:
+            text = event_log_text(rec.events[i], self.cards, rec.events[i - 1] if i else None)
+            if text:
+                lines.append(text)
+            i -= 1
+        self.action_log.clear()
+        self.action_log.extend(reversed(lines))
+
+def run_battle(p_deck_names, e_deck_names, scale=1.0):
+    global last_recording
+    init_display()
+    # The whole fight is resolved up front; the visuals only replay its events
+    start = time.perf_counter()
+    recording = record_battle(p_deck_names, e_deck_names, scale)
+    profiler.add(PROF_RESOLVE, time.perf_counter() - start)
+    if recording is None:
         print("Skipping battle: empty or invalid deck")
         return False
+    last_recording = recording
+    return play_recording(recording)
+
+def play_recording(recording, review=False):
+    """Show a recorded battle. Returns the victory flag, or False if left with ESC.
 
-    p_cards = [VisualCard(name, scale, 'player') for name in p_deck_names]
-    e_cards = [VisualCard(name, scale, 'enemy') for name in e_deck_names]
+    SPACE skips the current wait, P pauses, +/- change speed, LEFT/RIGHT step a
+    turn (SHIFT: ten turns) and clicking or dragging the timeline seeks. In
+    review mode the screen stays open at the end until ESC.
+    """
+    init_display()
+    popups.clear()
+    card_art.prefetch(recording.p_deck_names + recording.e_deck_names)
+    result = recording.result
+    p_cards = [VisualCard(name, recording.scale, 'player') for name in recording.p_deck_names]
+    e_cards = [VisualCard(name, recording.scale, 'enemy') for name in recording.e_deck_names]
 
-    # Positions
+    # Positions; decks longer than VISIBLE_SLOTS scroll vertically
     player_x = 220
     enemy_x = 920
     y_start = 160
     spacing = 95
     for i, card in enumerate(p_cards):
         card.pos = [player_x, y_start + i * spacing]
-        card.slot = i
+        card.state.slot = i
     for i, card in enumerate(e_cards):
         card.pos = [enemy_x, y_start + i * spacing]
-        card.slot = i
+        card.state.slot = i
+    cards = {(c.state.side, c.state.slot): c for c in p_cards + e_cards}
+    slots = max(len(p_cards), len(e_cards))
+    max_scroll = max(0, slots - VISIBLE_SLOTS) * spacing
+    field_clip = pygame.Rect(0, 90, SCREEN_WIDTH, SCREEN_HEIGHT - 150) if max_scroll else None
+    scroll = 0
+    drawn_scroll = 0
+    follow_front = True
+    front = {'player': 0, 'enemy': 0}
+    animating = set()
+    timeline_rect = pygame.Rect(340, SCREEN_HEIGHT - 40, 520, 14)
 
+    cursor = ReplayCursor(recording, cards)
+    action_log = cursor.action_log
+    presenter = DirtyRects()
     turn = 0
-    action_phase = 'status'
-    action_log = deque(maxlen=10)
+    p_total = sum(c.state.hp for c in p_cards)
+    e_total = sum(c.state.hp for c in e_cards)
     next_action_time = 0
     battle_end_timer = 0
     end_victory = False
     current_time = 0
     fast_forward = False
+    paused = False
+    speed = REPLAY_SPEEDS.index(1.0)
+    scrubbing = False
 
     while True:
         dt = clock.tick(60) / 1000.0
-        current_time += dt
+        profiler.begin_frame()
+        card_art.begin_frame()
+        seek_to = None
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
+            handle_profiler_key(event, presenter)
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_SPACE:
                     fast_forward = True
                 if event.key == pygame.K_ESCAPE:
                     return False
+                if event.key in (pygame.K_UP, pygame.K_DOWN, pygame.K_PAGEUP, pygame.K_PAGEDOWN):
+                    rows = VISIBLE_SLOTS if event.key in (pygame.K_PAGEUP, pygame.K_PAGEDOWN) else 1
+                    direction = -1 if event.key in (pygame.K_UP, pygame.K_PAGEUP) else 1
+                    scroll += direction * rows * spacing
+                    follow_front = False
+                if event.key == pygame.K_HOME:
+                    follow_front = True
+                if event.key == pygame.K_p:
+                    paused = not paused
+                if event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                    speed = min(speed + 1, len(REPLAY_SPEEDS) - 1)
+                if event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                    speed = max(speed - 1, 0)
+                if event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+                    turns = 10 if event.mod & pygame.KMOD_SHIFT else 1
+                    target_turn = cursor.step // 3 + (turns if event.key == pygame.K_RIGHT else -turns)
+                    seek_to = 3 * max(0, target_turn)
+            if event.type == pygame.MOUSEWHEEL:
+                scroll -= event.y * spacing
+                follow_front = False
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and timeline_rect.inflate(0, 16).collidepoint(event.pos):
+                scrubbing = True
+            if event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+                scrubbing = False
+            if scrubbing and event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEMOTION):
+                frac = min(1.0, max(0.0, (event.pos[0] - timeline_rect.x) / timeline_rect.w))
+                seek_to = 3 * round(frac * result.turns)
+        profiler.lap(PROF_EVENTS)
+
+        if seek_to is not None and seek_to != cursor.step:
+            cursor.seek(seek_to)
+            animating.clear()
+            front = {'player': 0, 'enemy': 0}
+            turn = cursor.step // 3
+            p_total = sum(c.state.hp for c in p_cards if c.state.alive)
+            e_total = sum(c.state.hp for c in e_cards if c.state.alive)
+            next_action_time = current_time + 0.8
+            battle_end_timer = 0
+            presenter.invalidate()
+
+        dt = 0.0 if paused else dt * REPLAY_SPEEDS[speed]
+        current_time += dt
 
         if fast_forward:
             next_action_time = current_time
             fast_forward = False
 
-        for card in p_cards + e_cards:
-            card.update(dt)
-
         if current_time >= next_action_time and battle_end_timer == 0:
             next_action_time = current_time + 0.8
 
-            if action_phase == 'status':
-                for card in p_cards + e_cards:
-                    if card.alive and card.burn_dmg > 0:
-                        bdmg = card.burn_dmg
-                        card.take_damage(bdmg)
-                        action_log.append(f"{card.name} burns for {int(bdmg)}!")
-                for card in p_cards:
-                    card.apply_entry([c for c in e_cards if c.alive], action_log)
-                for card in e_cards:
-                    card.apply_entry([c for c in p_cards if c.alive], action_log)
-                action_phase = 'player'
-
-            elif action_phase == 'player':
-                alive_p = [c for c in p_cards if c.alive]
-                alive_e = [c for c in e_cards if c.alive]
-                if alive_p and alive_e:
-                    attacker = min(alive_p, key=lambda c: c.slot)
-                    target = min(alive_e, key=lambda c: c.slot)
-                    attacker.attack(target, turn, action_log)
-                action_phase = 'enemy'
-
-            elif action_phase == 'enemy':
-                alive_e = [c for c in e_cards if c.alive]
-                alive_p = [c for c in p_cards if c.alive]
-                if alive_e and alive_p:
-                    attacker = min(alive_e, key=lambda c: c.slot)
-                    target = min(alive_p, key=lambda c: c.slot)
-                    attacker.attack(target, turn, action_log)
-                action_phase = 'status'
-                turn += 1
+            if cursor.step < recording.steps:
+                section = prof_sim_sections[cursor.step % 3]
+                profiler.lap(PROF_UPDATE)
+                events = cursor.advance()
+                profiler.lap(section)
+                for event in events:
+                    for key in ((event.side, event.slot), (event.target_side, event.target_slot)):
+                        if key in cards:
+                            animating.add(cards[key])
+            turn = cursor.step // 3
+            p_total = sum(c.state.hp for c in p_cards if c.state.alive)
+            e_total = sum(c.state.hp for c in e_cards if c.state.alive)
 
-            p_alive = any(c.alive for c in p_cards)
-            e_alive = any(c.alive for c in e_cards)
-            if not e_alive:
-                battle_end_timer = current_time + 3.0
-                end_victory = True
-            elif not p_alive:
+            if cursor.step >= recording.steps:
                 battle_end_timer = current_time + 3.0
-                end_victory = False
+                end_victory = result.victory
 
-        elif battle_end_timer > 0 and current_time >= battle_end_timer:
+        elif battle_end_timer > 0 and current_time >= battle_end_timer and not review:
             return end_victory
 
+        if follow_front:
+            for side, side_cards in (('player', p_cards), ('enemy', e_cards)):
+                while front[side] < len(side_cards) - 1 and not side_cards[front[side]].state.alive:
+                    front[side] += 1
+            scroll = min(front['player'], front['enemy']) * spacing
+        scroll = max(0, min(scroll, max_scroll))
+        if scroll != drawn_scroll:
+            presenter.invalidate()
+            drawn_scroll = scroll
+
+        # Only cards within reach of the screen are laid out, updated and drawn
+        first = max(0, (scroll - 200) // spacing)
+        last = (scroll + SCREEN_HEIGHT) // spacing + 1
+        visible = p_cards[first:last] + e_cards[first:last]
+        for card in visible:
+            card.pos[1] = y_start + card.state.slot * spacing - scroll
+        for card in animating.union(visible):
+            card.update(dt)
+        popups.update(dt)
+        animating = {c for c in animating if c.is_animating()}
+        profiler.lap(PROF_UPDATE)
+
         # Drawing code (same as before)
         screen.fill(DARK_BG)
-        p_title = med_font.render("Your Party", True, WHITE)
+        p_title = render_text(med_font, "Your Party", WHITE)
         screen.blit(p_title, (50, 50))
-        e_title = med_font.render("Enemies", True, WHITE)
+        e_title = render_text(med_font, "Enemies", WHITE)
         screen.blit(e_title, (SCREEN_WIDTH - 250, 50))
-        turn_surf = font.render(f"Turn {turn}", True, YELLOW)
+        turn_surf = render_text(font, f"Turn {turn}", YELLOW)
         screen.blit(turn_surf, (SCREEN_WIDTH // 2 - turn_surf.get_width() // 2, 20))
         pygame.draw.line(screen, WHITE, (580, 100), (580, SCREEN_HEIGHT - 150), 4)
+        if max_scroll:
+            top = scroll // spacing
+            shown = f"Slots {top + 1}-{min(slots, top + VISIBLE_SLOTS)} of {slots} (wheel/arrows, HOME follows front)"
+            hint = render_text(small_font, shown, GRAY)
+            screen.blit(hint, (SCREEN_WIDTH // 2 - hint.get_width() // 2, 65))
+            presenter.mark('scroll', (SCREEN_WIDTH // 2 - 300, 62, 600, 24), shown)
 
-        for card in p_cards + e_cards:
+        screen.set_clip(field_clip)
+        for card in visible:
             card.draw(screen)
+            # dirty_region() repeats the face lookup, so skip it when every frame is a full flip
+            if presenter.enabled:
+                rect, signature = card.dirty_region()
+                presenter.mark(('card', card.state.side, card.state.slot), rect, signature)
+        popups.draw(screen, presenter)
+        screen.set_clip(None)
+        profiler.lap(PROF_DRAW)
+        presenter.mark('turn', (SCREEN_WIDTH // 2 - 100, 15, 200, 50), turn)
 
-        p_total = sum(c.hp for c in p_cards if c.alive)
-        e_total = sum(c.hp for c in e_cards if c.alive)
-        screen.blit(med_font.render(f"Your HP: {int(p_total)}", True, GREEN), (50, SCREEN_HEIGHT - 60))
-        screen.blit(med_font.render(f"Enemy HP: {int(e_total)}", True, RED), (SCREEN_WIDTH - 300, SCREEN_HEIGHT - 60))
+        screen.blit(render_text(med_font, f"Your HP: {int(p_total)}", GREEN), (50, SCREEN_HEIGHT - 60))
+        screen.blit(render_text(med_font, f"Enemy HP: {int(e_total)}", RED), (SCREEN_WIDTH - 300, SCREEN_HEIGHT - 60))
+        presenter.mark('p_total', (50, SCREEN_HEIGHT - 60, 260, 40), int(p_total))
+        presenter.mark('e_total', (SCREEN_WIDTH - 300, SCREEN_HEIGHT - 60, 290, 40), int(e_total))
+
+        # Timeline: position in the recording, speed and pause state
+        pygame.draw.rect(screen, GRAY, timeline_rect)
+        progress = cursor.step / recording.steps if recording.steps else 1.0
+        pygame.draw.rect(screen, YELLOW, (timeline_rect.x, timeline_rect.y, int(timeline_rect.w * progress), timeline_rect.h))
+        pygame.draw.rect(screen, WHITE, timeline_rect, 1)
+        status = f"x{REPLAY_SPEEDS[speed]:g}{'  PAUSED' if paused else ''}  P pause  +/- speed  LEFT/RIGHT turn"
+        status_surf = render_text(small_font, status, WHITE)
+        screen.blit(status_surf, (timeline_rect.centerx - status_surf.get_width() // 2, timeline_rect.y - 22))
+        presenter.mark('timeline', timeline_rect.inflate(0, 50).move(0, -12), (cursor.step, status))
 
         log_y = SCREEN_HEIGHT - 150
         for i, log_txt in enumerate(list(action_log)):
-            log_surf = small_font.render(log_txt, True, WHITE)
+            log_surf = render_text(small_font, log_txt, WHITE)
             screen.blit(log_surf, (50, log_y - i * 22))
+        presenter.mark('log', (45, log_y - 9 * 22 - 5, 535, 10 * 22 + 10), tuple(action_log))
 
         if battle_end_timer > 0:
             alpha = int(200 * (1 - (current_time - (battle_end_timer - 3)) / 3))
-            overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, alpha))
-            screen.blit(overlay, (0, 0))
-            end_text = font.render("VICTORY!" if end_victory else "DEFEAT!", True, GREEN if end_victory else RED)
+            presenter.mark('fade', screen.get_rect(), alpha)
+            blit_overlay(screen, (SCREEN_WIDTH, SCREEN_HEIGHT), BLACK, alpha, (0, 0))
+            end_text = render_text(font, "VICTORY!" if end_victory else "DEFEAT!", GREEN if end_victory else RED)
             screen.blit(end_text, (SCREEN_WIDTH // 2 - end_text.get_width() // 2, SCREEN_HEIGHT // 2 - end_text.get_height() // 2))
-            cont_text = small_font.render("ESC to return", True, WHITE)
+            cont_text = render_text(small_font, "ESC to return", WHITE)
             screen.blit(cont_text, (SCREEN_WIDTH // 2 - cont_text.get_width() // 2, SCREEN_HEIGHT // 2 + 50))
 
-        pygame.display.flip()
+        profiler.draw_overlay(screen, presenter)
+        profiler.lap(PROF_HUD)
+        presenter.present()
+        profiler.lap(PROF_FLIP)
+        profiler.end_frame()
 
 def main():
+    init_display()
     data = load_save()
+    card_art.prefetch(data['deck'])
     state = 'main_menu'
     selected_slot = -1
     custom_enemy_deck = [None] * 4
+    battle_cache = BattleCache()
+    presenter = DirtyRects()
+    drawn_state = None
     back_button_rect = pygame.Rect(50, 50, 200, 60)
     done_button_rect = pygame.Rect(SCREEN_WIDTH - 300, SCREEN_HEIGHT - 100, 250, 60)
+    mass_button_rect = pygame.Rect(SCREEN_WIDTH - 580, SCREEN_HEIGHT - 100, 250, 60)
+
+    mouse_pos = None
+    idle_time = 0.0
+    if 'TOWERCLASH_PROFILE_EXPORT' in os.environ:
+        atexit.register(profiler.export)
 
     while True:
-        dt = clock.tick(60) / 1000.0
+        if idle_time >= IDLE_AFTER:
+            # Nothing changed for a while: block on input instead of redrawing identical frames
+            waited = pygame.event.wait(IDLE_WAIT_MS)
+            events = [] if waited.type == pygame.NOEVENT else [waited]
+            events += pygame.event.get()
+            dt = clock.tick() / 1000.0
+            if not events and pygame.mouse.get_pos() == mouse_pos:
+                continue
+            profiler.begin_frame()
+        else:
+            dt = clock.tick(60) / 1000.0
+            profiler.begin_frame()
+            events = pygame.event.get()
+        card_art.begin_frame()
+        prev_mouse_pos = mouse_pos
         mouse_pos = pygame.mouse.get_pos()
+        idle_time = 0.0 if events or mouse_pos != prev_mouse_pos else idle_time + dt
         clicked = False
-        for event in pygame.event.get():
+        for event in events:
             if event.type == pygame.QUIT:
                 save_game(data)
                 pygame.quit()
                 sys.exit()
+            handle_profiler_key(event, presenter)
             if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                 clicked = True
+        profiler.lap(PROF_EVENTS)
 
         screen.fill(DARK_BG)
+        layout_changed = state != drawn_state
+        drawn_state = state
 
         if state == 'main_menu':
             buttons = [
@@ -380,11 +1689,14 @@ def main():
                 (pygame.Rect(100, 450, 400, 70), "Custom Battle"),
                 (pygame.Rect(100, 550, 400, 70), "Quit")
             ]
+            if last_recording is not None:
+                buttons.append((pygame.Rect(600, 150, 400, 70), "Replay Last Battle"))
             for rect, text in buttons:
                 color = BLUE if rect.collidepoint(mouse_pos) else (50, 50, 150) if text != "Quit" else RED
                 pygame.draw.rect(screen, color, rect)
                 pygame.draw.rect(screen, WHITE, rect, 3)
-                txt_surf = med_font.render(text, True, WHITE)
+                presenter.mark(('button', text), rect, color)
+                txt_surf = render_text(med_font, text, WHITE)
                 screen.blit(txt_surf, (rect.centerx - txt_surf.get_width() // 2, rect.centery - txt_surf.get_height() // 2))
 
             if clicked:
@@ -402,6 +1714,9 @@ def main():
                             state = 'tower_select'
                         elif text == "Custom Battle":
                             state = 'custom_build'
+                        elif text == "Replay Last Battle":
+                            play_recording(last_recording, review=True)
+                            presenter.invalidate()
 
         elif state in ['build_deck', 'custom_build']:
             is_custom = state == 'custom_build'
@@ -417,10 +1732,11 @@ def main():
                 pygame.draw.rect(screen, color, rect)
                 pygame.draw.rect(screen, WHITE, rect, 3)
                 name = target_deck[i] if target_deck[i] else "Empty"
-                txt = med_font.render(f"Slot {i+1}: {name}", True, WHITE)
+                txt = render_text(med_font, f"Slot {i+1}: {name}", WHITE)
                 screen.blit(txt, (rect.x + 10, rect.y + 15))
                 if i == selected_slot:
                     pygame.draw.rect(screen, YELLOW, rect, 5)
+                presenter.mark(('slot', i), rect, (color, name, i == selected_slot))
 
             y = 150
             unlocked_rects = []
@@ -430,20 +1746,27 @@ def main():
                 color = card_colors.get(card, GRAY)
                 pygame.draw.rect(screen, color if not rect.collidepoint(mouse_pos) else (*color, 220), rect)
                 pygame.draw.rect(screen, WHITE, rect, 2)
-                txt = small_font.render(card, True, BLACK)
+                txt = render_text(small_font, card, BLACK)
                 screen.blit(txt, (660, y + 15))
+                presenter.mark(('unlocked', card), rect, rect.collidepoint(mouse_pos))
                 y += 55
 
+            if is_custom:
+                pygame.draw.rect(screen, ORANGE, mass_button_rect)
+                pygame.draw.rect(screen, WHITE, mass_button_rect, 3)
+                mass_txt = render_text(med_font, f"Mass x{MASS_BATTLE_COPIES}", WHITE)
+                screen.blit(mass_txt, (mass_button_rect.centerx - mass_txt.get_width() // 2, mass_button_rect.centery - mass_txt.get_height() // 2))
+
             pygame.draw.rect(screen, GREEN, done_button_rect)
             pygame.draw.rect(screen, WHITE, done_button_rect, 3)
-            done_txt = med_font.render("Done" if not is_custom else "Battle!", True, WHITE)
+            done_txt = render_text(med_font, "Done" if not is_custom else "Battle!", WHITE)
             screen.blit(done_txt, (done_button_rect.centerx - done_txt.get_width() // 2, done_button_rect.centery - done_txt.get_height() // 2))
 
             pygame.draw.rect(screen, BLUE, back_button_rect)
-            back_txt = med_font.render("Back", True, WHITE)
+            back_txt = render_text(med_font, "Back", WHITE)
             screen.blit(back_txt, (back_button_rect.centerx - back_txt.get_width() // 2, back_button_rect.centery - back_txt.get_height() // 2))
 
-            title_txt = font.render(deck_name, True, WHITE)
+            title_txt = render_text(font, deck_name, WHITE)
             screen.blit(title_txt, (SCREEN_WIDTH // 2 - title_txt.get_width() // 2, 50))
 
             if clicked:
@@ -466,10 +1789,18 @@ def main():
                         valid_deck = [d for d in custom_enemy_deck if d]
                         if valid_deck:
                             win = run_battle(data['deck'], valid_deck, 1.0)
+                            presenter.invalidate()
                             print(f"Custom Battle: {'Win!' if win else 'Loss!'}")
                     else:
                         save_game(data)
                     state = 'main_menu'
+                elif is_custom and mass_button_rect.collidepoint(mouse_pos):
+                    valid_deck = [d for d in custom_enemy_deck if d]
+                    if valid_deck:
+                        win = run_battle(data['deck'] * MASS_BATTLE_COPIES, valid_deck * MASS_BATTLE_COPIES, 1.0)
+                        presenter.invalidate()
+                        print(f"Mass Battle: {'Win!' if win else 'Loss!'}")
+                        state = 'main_menu'
                 elif back_button_rect.collidepoint(mouse_pos):
                     state = 'main_menu'
                     if is_custom:
@@ -482,11 +1813,11 @@ def main():
                 rect = pygame.Rect(100, y, 500, 50)
                 pygame.draw.rect(screen, color, rect)
                 pygame.draw.rect(screen, WHITE, rect, 2)
-                txt = small_font.render(card, True, BLACK)
+                txt = render_text(small_font, card, BLACK)
                 screen.blit(txt, (110, y + 15))
                 y += 60
             pygame.draw.rect(screen, BLUE, back_button_rect)
-            txt = med_font.render("Back", True, WHITE)
+            txt = render_text(med_font, "Back", WHITE)
             screen.blit(txt, (back_button_rect.centerx - txt.get_width() // 2, back_button_rect.centery - txt.get_height() // 2))
             if clicked and back_button_rect.collidepoint(mouse_pos):
                 state = 'main_menu'
@@ -494,23 +1825,43 @@ def main():
         elif state == 'tower_select':
             y = 200
             tower_buttons = []
-            for tkey in ['tower1', 'tower2', 'tower3']:
+            for tkey in towers:
                 prog = data['progress'][tkey]
                 if prog < 0:
                     continue
                 rect = pygame.Rect(200, y, 800, 80)
-                tower_buttons.append((tkey, rect))
-                color = ORANGE if rect.collidepoint(mouse_pos) else (100, 50, 0)
+                name = towers[tkey]['name']
+                # A cleared tower has no floor left to fight, so it is shown but not clickable
+                cleared = prog >= towers[tkey]['floors']
+                if cleared:
+                    color = GRAY
+                    label = f"{name} - Cleared"
+                else:
+                    tower_buttons.append((tkey, rect))
+                    color = ORANGE if rect.collidepoint(mouse_pos) else (100, 50, 0)
+                    label = f"{name} - Floor {prog + 1}/{towers[tkey]['floors']}"
+                prediction = None
+                if not cleared:
+                    done, predicted = battle_cache.predict(data['deck'], floor_enemies(tkey, prog), floor_scale(prog))
+                    if not done:
+                        prediction = "Predicting..."
+                        # Keep redrawing until the background result arrives
+                        idle_time = 0.0
+                    elif predicted is not None:
+                        verdict = "Win" if predicted.victory else "Loss"
+                        prediction = f"Predicted: {verdict} in {predicted.turns} turns"
                 pygame.draw.rect(screen, color, rect)
                 pygame.draw.rect(screen, WHITE, rect, 4)
-                name = towers[tkey]['name']
-                floor = prog + 1
-                txt = font.render(f"{name} - Floor {floor}/{towers[tkey]['floors']}", True, WHITE)
+                presenter.mark(('tower', tkey), rect, (color, prog, prediction))
+                txt = render_text(font, label, WHITE)
                 screen.blit(txt, (rect.centerx - txt.get_width() // 2, rect.centery - txt.get_height() // 2))
+                if prediction is not None:
+                    ptxt = render_text(small_font, prediction, WHITE)
+                    screen.blit(ptxt, (rect.right - ptxt.get_width() - 10, rect.bottom - ptxt.get_height() - 6))
                 y += 100
 
             pygame.draw.rect(screen, BLUE, back_button_rect)
-            txt = med_font.render("Back", True, WHITE)
+            txt = render_text(med_font, "Back", WHITE)
             screen.blit(txt, (back_button_rect.centerx - txt.get_width() // 2, back_button_rect.centery - txt.get_height() // 2))
 
             if clicked:
@@ -518,27 +1869,29 @@ def main():
                     if rect.collidepoint(mouse_pos):
                         current_tower = tkey
                         floor = data['progress'][tkey]
-                        scale = 1.0 + 0.3 * floor
-                        enemy_deck = towers[tkey]['enemies'][floor]
-                        enemy_deck = [card for sublist in enemy_deck for card in sublist]  # flatten
-                        win = run_battle(data['deck'], enemy_deck, scale)
+                        win = run_battle(data['deck'], floor_enemies(tkey, floor), floor_scale(floor))
+                        presenter.invalidate()
                         if win:
                             data['progress'][tkey] += 1
                             if data['progress'][tkey] == towers[tkey]['floors']:
                                 data['unlocked'].extend(towers[tkey]['unlock'])
                                 data['unlocked'] = list(set(data['unlocked']))
                                 print(f"TOWER CLEARED! Unlocked: {towers[tkey]['unlock']}")
-                                if tkey == 'tower1':
-                                    data['progress']['tower2'] = 0
-                                elif tkey == 'tower2':
-                                    data['progress']['tower3'] = 0
+                                next_tower = towers[tkey]['next']
+                                if next_tower is not None and data['progress'][next_tower] < 0:
+                                    data['progress'][next_tower] = 0
                             save_game(data)
                         state = 'main_menu'
                         break
                 if back_button_rect.collidepoint(mouse_pos):
                     state = 'main_menu'
 
-        pygame.display.flip()
+        profiler.lap(PROF_DRAW)
+        profiler.draw_overlay(screen, presenter)
+        profiler.lap(PROF_HUD)
+        presenter.present(full=layout_changed)
+        profiler.lap(PROF_FLIP)
+        profiler.end_frame()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
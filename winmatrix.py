@@ -0,0 +1,112 @@
+"""Play every legal 4-slot deck against every tower floor and store the results.
+
+    python winmatrix.py [--unlocked] [--workers N] [--chunk-size N] [--resume] [-o win_matrix.npy]
+
+The matrix is a NumPy structured array of shape (decks, floors) saved as .npy,
+with a JSON sidecar (same name, .json) listing the decks and floors. Rows are
+written as chunks finish, so an interrupted run can be continued with --resume.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+import batchsim
+import towerclash as tc
+
+DECK_SLOTS = 4
+PENDING = -1
+
+matrix_dtype = np.dtype([
+    ('outcome', np.int8),  # 1 victory, 0 defeat, PENDING not played yet
+    ('turns', np.uint16),
+    ('player_hp', np.float32),
+    ('enemy_hp', np.float32),
+])
+
+
+def all_decks(names):
+    return [list(deck) for deck in itertools.product(sorted(set(names)), repeat=DECK_SLOTS)]
+
+
+def all_floors():
+    return [(tkey, floor) for tkey in tc.towers for floor in range(tc.towers[tkey]['floors'])]
+
+
+def play_chunk(job):
+    start, decks, floors = job
+    matchups = [(deck, tc.floor_enemies(tkey, floor), tc.floor_scale(floor)) for deck in decks for tkey, floor in floors]
+    res = batchsim.simulate_batch(matchups)
+    rows = np.zeros(len(matchups), dtype=matrix_dtype)
+    rows['outcome'] = res.victory
+    rows['turns'] = res.turns
+    rows['player_hp'] = res.player_hp
+    rows['enemy_hp'] = res.enemy_hp
+    return start, rows.reshape(len(decks), len(floors))
+
+
+def open_matrix(path, decks, floors, resume):
+    meta_path = os.path.splitext(path)[0] + '.json'
+    meta = {'decks': decks, 'floors': floors}
+    if resume and os.path.exists(path) and os.path.exists(meta_path):
+        with open(meta_path, 'r') as f:
+            old_meta = json.load(f)
+        if old_meta['decks'] != decks or [tuple(fl) for fl in old_meta['floors']] != floors:
+            sys.exit(f"{path} was generated for different decks/floors; run without --resume")
+        return np.lib.format.open_memmap(path, mode='r+')
+    matrix = np.lib.format.open_memmap(path, mode='w+', dtype=matrix_dtype, shape=(len(decks), len(floors)))
+    matrix['outcome'] = PENDING
+    matrix.flush()
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    return matrix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the deck-vs-floor win matrix.")
+    parser.add_argument('-o', '--out', default='win_matrix.npy')
+    parser.add_argument('--unlocked', action='store_true', help="only use cards unlocked in the save file")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk-size', type=int, default=64, help="decks per work item")
+    parser.add_argument('--resume', action='store_true', help="continue an interrupted run")
+    args = parser.parse_args(argv)
+
+    names = tc.load_save()['unlocked'] if args.unlocked else list(tc.card_data)
+    decks = all_decks(tc.clean_deck(names))
+    floors = all_floors()
+    matrix = open_matrix(args.out, decks, floors, args.resume)
+
+    pending = np.nonzero((matrix['outcome'] == PENDING).any(axis=1))[0]
+    starts = sorted({int(i) - int(i) % args.chunk_size for i in pending})
+    jobs = [(s, decks[s:s + args.chunk_size], floors) for s in starts]
+    print(f"{len(decks)} decks x {len(floors)} floors, {len(jobs)} chunks to play")
+
+    t0 = time.perf_counter()
+    done = 0
+    try:
+        with Pool(args.workers) as pool:
+            for start, rows in pool.imap_unordered(play_chunk, jobs):
+                matrix[start:start + len(rows)] = rows
+                done += 1
+                if done % 16 == 0 or done == len(jobs):
+                    matrix.flush()
+                elapsed = time.perf_counter() - t0
+                print(f"\r{done}/{len(jobs)} chunks, {elapsed:.1f}s", end='', file=sys.stderr, flush=True)
+    except KeyboardInterrupt:
+        print("\nInterrupted; rerun with --resume to continue", file=sys.stderr)
+    finally:
+        matrix.flush()
+    print(file=sys.stderr)
+
+    played = matrix['outcome'] != PENDING
+    wins = (matrix['outcome'] == 1).sum()
+    print(f"{played.sum()}/{played.size} battles played, {wins} wins -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()